@@ -0,0 +1,392 @@
+"""
+Load test against local upstream stand-ins.
+
+Starts bench/mock_upstreams.py and the app under gunicorn, in a scratch
+working directory so feeds, indexes and history start empty, and points
+every provider at the mocks. It then drives each scenario at a fixed
+concurrency and reports throughput, latency percentiles and the app's
+resident memory (all gunicorn processes).
+
+    python bench/load.py                                  # every scenario, ASGI app
+    python bench/load.py --app main --workers 2 scan_ip pagerank
+    python bench/load.py --latency 80 --error-rate internetdb=0.05 --json run.json
+    python bench/load.py --baseline run.json --tolerance 0.15   # exit 1 on regression
+
+Use --target to drive an already running app instead (RSS is then not
+reported and upstreams are whatever that app is configured with).
+"""
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import httpx
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(BENCH), "src")
+sys.path.insert(0, BENCH)
+
+from mock_upstreams import add_profile_arguments, app_env  # noqa: E402
+
+SCENARIOS = (
+    "scan_ip", "scan_domain", "scan_batch", "footprint_email", "footprint_phone",
+    "footprint_username", "footprint_usernames", "footprint_phones", "footprint_emails", "capa", "pagerank",
+)
+
+
+# -- request factories --------------------------------------------------------
+
+def minimal_pe(seed=0):
+    """A small but well-formed PE32 executable with one .text section."""
+    rng = random.Random(seed)
+    dos = b"MZ" + b"\x00" * 58 + struct.pack("<I", 0x40)
+    file_header = struct.pack("<HHIIIHH", 0x14C, 1, 0x5F000000 + seed, 0, 0, 0xE0, 0x0102)
+    optional = struct.pack(
+        "<HBBIIIIIIIIIHHHHHHIIIIHHIIIIII",
+        0x10B, 14, 0, 0x200, 0, 0, 0x1000, 0x1000, 0x2000, 0x400000, 0x1000, 0x200,
+        6, 0, 0, 0, 6, 0, 0, 0x2000, 0x200, 0, 2, 0, 0x100000, 0x1000, 0x100000, 0x1000, 0, 16,
+    ) + b"\x00" * 128
+    section = struct.pack("<8sIIIIIIHHI", b".text", 0x1000, 0x1000, 0x200, 0x200, 0, 0, 0, 0, 0x60000020)
+    headers = dos + b"PE\x00\x00" + file_header + optional + section
+    return headers.ljust(0x200, b"\x00") + bytes(rng.getrandbits(8) for _ in range(0x200))
+
+
+def random_graph(nodes=200, edges=800, seed=0):
+    rng = random.Random(seed)
+    return {
+        "nodes": [{"id": f"n{i}"} for i in range(nodes)],
+        "edges": [{"source": f"n{rng.randrange(nodes)}", "target": f"n{rng.randrange(nodes)}"} for _ in range(edges)],
+    }
+
+
+def make_request(scenario, n, rng):
+    """Returns (method, path, kwargs) for request number `n` of a scenario."""
+    if scenario == "scan_ip":
+        # Random public-looking addresses: mostly cache misses, like real traffic
+        ip = f"{rng.randint(11, 199)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        return "POST", "/scan", {"json": {"query": ip}}
+    if scenario == "scan_domain":
+        return "POST", "/scan", {"json": {"query": f"host{n}.bench-{rng.randint(1, 200000)}.com"}}
+    if scenario == "footprint_email":
+        return "POST", "/footprint", {"json": {"query": f"user{n}.{rng.randint(0, 10**6)}@bench.mock"}}
+    if scenario == "footprint_phone":
+        return "POST", "/footprint", {"json": {"query": f"+1415{rng.randint(1000000, 9999999)}"}}
+    if scenario == "footprint_username":
+        return "POST", "/footprint", {"json": {"query": f"benchuser{n}x{rng.randint(0, 10**6)}"}}
+    if scenario == "footprint_usernames":
+        names = [f"bench.user{n}x{rng.randint(0, 10**6)}" for _ in range(5)]
+        return "POST", "/footprint/usernames", {"json": {"usernames": names, "variants": True}}
+    if scenario == "footprint_phones":
+        # A mix of valid numbers and junk the offline plan rejects
+        numbers = [f"+1415{rng.randint(2000000, 9999999)}" for _ in range(20)] + [str(rng.randint(10, 10**6))]
+        return "POST", "/footprint/phones", {"json": {"numbers": numbers}}
+    if scenario == "footprint_emails":
+        emails = [f"user{n}.{i}.{rng.randint(0, 10**6)}@bench.mock" for i in range(20)]
+        return "POST", "/footprint/emails", {"json": {"emails": emails}}
+    if scenario == "capa":
+        return "POST", "/capa_analyze", {"files": {"file": (f"sample{n}.exe", minimal_pe(n % 64))}}
+    if scenario == "pagerank":
+        return "POST", "/pagerank", {"json": random_graph(seed=n % 16)}
+    raise ValueError(f"unknown scenario {scenario}")
+
+
+# -- server processes ---------------------------------------------------------
+
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def process_tree(pid):
+    pids = [pid]
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # the command name is parenthesised and may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            pids.append(int(entry))
+    return pids
+
+
+def rss_bytes(pid):
+    """Resident memory of a process and its direct children (gunicorn workers)."""
+    total = 0
+    for child in process_tree(pid):
+        try:
+            with open(f"/proc/{child}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+class Stack:
+    """The mock upstreams plus the app under test, in a scratch directory."""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="recongraph-bench-")
+        os.makedirs(os.path.join(self.workdir, "media"))
+        self.mock_port, self.dns_port, self.app_port = free_port(), free_port(socket.SOCK_DGRAM), free_port()
+        self.mock = self.app = None
+
+    def start(self):
+        mock_cmd = [sys.executable, os.path.join(BENCH, "mock_upstreams.py"),
+                    "--port", str(self.mock_port), "--dns-port", str(self.dns_port)]
+        for option in ("latency", "jitter", "error_rate", "body_size"):
+            for value in getattr(self.args, option) or []:
+                mock_cmd += [f"--{option.replace('_', '-')}", value]
+        self.mock = subprocess.Popen(mock_cmd)
+        wait_for(f"http://127.0.0.1:{self.mock_port}/_stats")
+
+        env = {**os.environ, **app_env("127.0.0.1", self.mock_port, self.dns_port, self.args.real_limits)}
+        env["PYTHONPATH"] = SRC
+        worker_class = "uvicorn.workers.UvicornWorker" if self.args.app == "asgi" else "gthread"
+        app_cmd = [sys.executable, "-m", "gunicorn", f"{self.args.app}:app",
+                   "--bind", f"127.0.0.1:{self.app_port}", "--workers", str(self.args.workers),
+                   "--worker-class", worker_class, "--threads", str(self.args.threads),
+                   "--timeout", "120", "--log-level", "warning"]
+        self.app = subprocess.Popen(app_cmd, cwd=self.workdir, env=env)
+        wait_for(f"http://127.0.0.1:{self.app_port}/")
+        return f"http://127.0.0.1:{self.app_port}"
+
+    def rss(self):
+        return rss_bytes(self.app.pid) if self.app else None
+
+    def upstream_stats(self):
+        try:
+            return httpx.get(f"http://127.0.0.1:{self.mock_port}/_stats", timeout=5).json()
+        except httpx.HTTPError:
+            return None
+
+    def stop(self):
+        for process in (self.app, self.mock):
+            if process and process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+                try:
+                    process.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# -- driver -------------------------------------------------------------------
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_scenario(base_url, scenario, args, rss=None):
+    rng = random.Random(args.seed)
+    latencies = []
+    errors = 0
+    issued = 0
+    peak_rss = rss() if rss else None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def one(n):
+            nonlocal errors
+            method, path, kwargs = make_request(scenario, n, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            return time.perf_counter() - started
+
+        async def worker():
+            nonlocal issued
+            while issued < args.requests:
+                n = issued
+                issued += 1
+                if scenario == "scan_batch":
+                    # A burst of mixed IP/domain scans fired together; the
+                    # latency is the time until the whole batch is back.
+                    started = time.perf_counter()
+                    await asyncio.gather(*(
+                        one_mixed(n * args.batch_size + i) for i in range(args.batch_size)
+                    ))
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    latencies.append(await one(n))
+
+        async def one_mixed(n):
+            nonlocal errors
+            kind = "scan_ip" if n % 4 else "scan_domain"
+            method, path, kwargs = make_request(kind, n, rng)
+            try:
+                response = await client.request(method, path, **kwargs)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+
+        async def sample_rss():
+            nonlocal peak_rss
+            while True:
+                await asyncio.sleep(0.5)
+                peak_rss = max(peak_rss, await asyncio.to_thread(rss))
+
+        sampler = asyncio.create_task(sample_rss()) if rss else None
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        if sampler:
+            sampler.cancel()
+
+    latencies.sort()
+    final_rss = rss() if rss else None
+    if rss:
+        peak_rss = max(peak_rss, final_rss)
+    completed = len(latencies) * (args.batch_size if scenario == "scan_batch" else 1)
+    return {
+        "scenario": scenario,
+        "requests": completed,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "rss_mb": round(final_rss / 2**20, 1) if rss else None,
+        "peak_rss_mb": round(peak_rss / 2**20, 1) if rss else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of throughput or p95 latency beyond `tolerance` vs a baseline run."""
+    previous = {row["scenario"]: row for row in baseline.get("results", [])}
+    regressions = []
+    for row in results:
+        before = previous.get(row["scenario"])
+        if not before:
+            continue
+        if row["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{row['scenario']}: throughput {before['throughput_rps']} -> {row['throughput_rps']} rps")
+        if row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{row['scenario']}: p95 {before['p95_ms']} -> {row['p95_ms']} ms")
+    return regressions
+
+
+def print_table(results):
+    columns = ("scenario", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+    widths = [max(len(column), *(len(str(row[column])) for row in results)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in results:
+        print("  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+async def run(args):
+    stack = None
+    if args.target:
+        base_url, rss = args.target.rstrip("/"), None
+    else:
+        stack = Stack(args)
+        base_url = stack.start()
+        rss = stack.rss
+    try:
+        results = []
+        for scenario in args.scenarios:
+            # Warm-up: imports, feed downloads and index builds happen here
+            warmup = argparse_copy(args, requests=min(args.warmup, args.requests), concurrency=1)
+            if warmup.requests:
+                await run_scenario(base_url, scenario, warmup)
+            result = await run_scenario(base_url, scenario, args, rss)
+            results.append(result)
+            print(json.dumps(result), file=sys.stderr)
+        upstreams = stack.upstream_stats() if stack else None
+    finally:
+        if stack:
+            stack.stop()
+    return results, upstreams
+
+
+def argparse_copy(args, **overrides):
+    copy = type(args)(**vars(args))
+    for key, value in overrides.items():
+        setattr(copy, key, value)
+    return copy
+
+
+def main():
+    parser = ArgumentParser(description="Load-test the backend against local upstream stand-ins")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), metavar="scenario",
+                        help=f"any of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--app", choices=("asgi", "main"), default="asgi")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker for the Flask app")
+    parser.add_argument("--target", help="drive an already running app at this URL")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-n", "--requests", type=int, default=200, help="requests (or batches) per scenario")
+    parser.add_argument("--batch-size", type=int, default=10, help="scans per scan_batch burst")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--real-limits", action="store_true", help="keep the providers' free-tier rate limits")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare with a previous --json run")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    results, upstreams = asyncio.run(run(args))
+    print_table(results)
+    if upstreams:
+        print(f"upstream requests: {upstreams['requests']}, injected errors: {upstreams['errors']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"app": args.app, "workers": args.workers, "concurrency": args.concurrency,
+                       "results": results, "upstreams": upstreams}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
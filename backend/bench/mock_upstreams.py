@@ -0,0 +1,396 @@
+"""
+Local stand-ins for every upstream the backend talks to.
+
+One HTTP server emulates ip-api, InternetDB, ThreatFox, Tranco (API and
+top-1M list), XposedOrNot, NumVerify, the username sites and the Talos/Tor/
+Public Suffix List feeds, each under its own path prefix. A small UDP DNS
+server answers A queries so domain scans resolve too. Answers are
+deterministic per query; latency, jitter, error rate and padding are
+configurable globally or per service:
+
+    python bench/mock_upstreams.py --latency 40 --latency internetdb=150 \\
+        --error-rate 0.01 --body-size 2048
+
+Run with --print-env to get the environment that points the app here.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import random
+import sys
+import zipfile
+from argparse import ArgumentParser
+from urllib.parse import parse_qs, unquote
+
+SERVICES = (
+    "ipapi", "internetdb", "threatfox", "tranco", "xposedornot", "numverify", "sites", "feeds",
+)
+# Domains in the mock Tranco list; bench domains are bench-<n>.com
+TRANCO_SIZE = 100_000
+
+
+class Profile:
+    def __init__(self, latency=20.0, jitter=5.0, error_rate=0.0, body_size=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.body_size = body_size
+
+
+def _seed(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+
+
+def _parse_overrides(values, cast):
+    """["40", "internetdb=150"] -> (40, {"internetdb": 150})"""
+    default, overrides = None, {}
+    for value in values or []:
+        if "=" in value:
+            service, number = value.split("=", 1)
+            if service not in SERVICES:
+                raise SystemExit(f"unknown service {service!r}, expected one of: {', '.join(SERVICES)}")
+            overrides[service] = cast(number)
+        else:
+            default = cast(value)
+    return default, overrides
+
+
+def profiles_from_args(args):
+    fields = {
+        "latency": _parse_overrides(args.latency, float),
+        "jitter": _parse_overrides(args.jitter, float),
+        "error_rate": _parse_overrides(args.error_rate, float),
+        "body_size": _parse_overrides(args.body_size, int),
+    }
+    profiles = {}
+    for service in SERVICES:
+        profile = Profile()
+        for field, (default, overrides) in fields.items():
+            if default is not None:
+                setattr(profile, field, default)
+            if service in overrides:
+                setattr(profile, field, overrides[service])
+        profiles[service] = profile
+    # Feeds are downloads made once at startup, not part of the measured path
+    profiles["feeds"] = Profile(latency=0, jitter=0)
+    return profiles
+
+
+# -- responses --------------------------------------------------------------
+
+def ipapi(queries):
+    answers = []
+    for item in queries:
+        ip = item.get("query", "")
+        rng = random.Random(_seed(ip))
+        answers.append({
+            "status": "success", "query": ip, "country": "United States", "countryCode": "US",
+            "region": "CA", "regionName": "California", "city": "Mountain View", "zip": "94043",
+            "timezone": "America/Los_Angeles", "isp": "Mock ISP", "org": "Mock Org",
+            "as": f"AS{rng.randint(1000, 65000)} Mock Networks",
+        })
+    return 200, answers
+
+
+def internetdb(ip):
+    rng = random.Random(_seed(ip))
+    if rng.random() < 0.2:
+        return 404, {"detail": "No information available"}
+    ports = sorted(rng.sample([21, 22, 23, 25, 53, 80, 110, 143, 443, 445, 3306, 3389, 8080], rng.randint(1, 5)))
+    vulns = [f"CVE-{rng.randint(2015, 2024)}-{rng.randint(1000, 49999)}" for _ in range(rng.randint(0, 6))]
+    tags = rng.sample(["cloud", "cdn", "vpn", "proxy", "self-signed", "honeypot"], rng.randint(0, 2))
+    return 200, {"ip": ip, "hostnames": [f"host-{ip.replace('.', '-')}.mock"], "ports": ports,
+                 "tags": tags, "vulns": vulns, "cpes": []}
+
+
+def threatfox(body):
+    term = body.get("search_term", "")
+    rng = random.Random(_seed(term))
+    if rng.random() < 0.9:
+        return 200, {"query_status": "no_result", "data": "Your search did not yield any results"}
+    return 200, {"query_status": "ok", "data": [{
+        "id": str(rng.randint(100000, 999999)), "ioc": term, "threat_type": "botnet_cc",
+        "malware_printable": "Mock Stealer", "confidence_level": 75, "reference": None,
+    }]}
+
+
+def tranco_rank(domain):
+    rng = random.Random(_seed(domain))
+    if rng.random() < 0.5:
+        return 200, {"domain": domain, "ranks": []}
+    return 200, {"domain": domain, "ranks": [{"date": "2024-01-01", "rank": rng.randint(1, 1_000_000)}]}
+
+
+def tranco_list():
+    rows = "".join(f"{rank},bench-{rank}.com\n" for rank in range(1, TRANCO_SIZE + 1))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("top-1m.csv", rows)
+    return buffer.getvalue()
+
+
+BREACH_CATALOG = 500
+
+
+def _breach(i):
+    rng = random.Random(i)
+    return {
+        "breach": f"MockBreach{i}", "details": "Mock breach record", "domain": f"breach{i}.mock",
+        "industry": "Tech", "password_risk": "plaintext", "references": "", "searchable": "Yes",
+        "verified": "Yes", "xposed_data": "Email addresses;Passwords", "xposed_date": "2019",
+        "xposed_records": rng.randint(1000, 10_000_000), "logo": "",
+    }
+
+
+def _breaches_for(email):
+    rng = random.Random(_seed(email))
+    if rng.random() < 0.3:
+        return []
+    return sorted(rng.sample(range(BREACH_CATALOG), rng.randint(1, 8)))
+
+
+def check_email(email):
+    ids = _breaches_for(email)
+    if not ids:
+        return 404, {"Error": "Not found"}
+    return 200, {"breaches": [[f"MockBreach{i}" for i in ids]]}
+
+
+def breach_analytics(email):
+    rng = random.Random(_seed(email))
+    ids = _breaches_for(email)
+    if not ids:
+        return 200, {"ExposedBreaches": None, "BreachMetrics": None}
+    return 200, {
+        "ExposedBreaches": {"breaches_details": [_breach(i) for i in ids]},
+        "BreachMetrics": {
+            "passwords_strength": [{"EasyToCrack": 1, "PlainText": 2, "StrongHash": 0, "Unknown": 0}],
+            "risk": [{"risk_label": rng.choice(["Low", "Medium", "High"]), "risk_score": rng.randint(1, 10)}],
+        },
+    }
+
+
+def breach_catalog():
+    return 200, {"exposedBreaches": [{
+        "breachID": breach["breach"], "breachedDate": "2019-01-01T00:00:00+00:00", "domain": breach["domain"],
+        "industry": breach["industry"], "logo": "", "passwordRisk": breach["password_risk"], "searchable": True,
+        "sensitive": False, "verified": True, "exposedData": breach["xposed_data"].split(";"),
+        "exposedRecords": breach["xposed_records"], "exposureDescription": breach["details"], "referenceURL": "",
+    } for breach in map(_breach, range(BREACH_CATALOG))]}
+
+
+def numverify(number):
+    digits = "".join(ch for ch in number if ch.isdigit())
+    if len(digits) < 8:
+        return 200, {"valid": False, "number": digits}
+    return 200, {
+        "valid": True, "number": digits, "local_format": digits[-10:],
+        "international_format": f"+{digits}", "country_prefix": "+1", "country_code": "US",
+        "country_name": "United States of America", "location": "Novato", "carrier": "Mock Wireless",
+        "line_type": "mobile",
+    }
+
+
+def site(site_name, username):
+    rng = random.Random(_seed(f"{site_name}/{username}"))
+    if rng.random() < 0.8:
+        return 404, "<html><head><title>Not Found</title></head><body>Page not found</body></html>"
+    return 200, (f"<html><head><title>{username} on {site_name}</title></head>"
+                 f"<body><h1>{username}</h1><p>Profile of {username}</p></body></html>")
+
+
+FEEDS = {
+    "talos": "\n".join(f"203.0.113.{i}" for i in range(1, 200)) + "\n",
+    "tor": "".join(f"ExitNode {i:040X}\nExitAddress 198.51.100.{i} 2024-01-01 00:00:00\n" for i in range(1, 100)),
+    "psl": "// mock public suffix list\ncom\nnet\norg\nio\nmock\nco.uk\n*.ck\n!www.ck\n",
+}
+
+
+class MockUpstreams:
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.counts = {service: 0 for service in SERVICES}
+        self.errors = {service: 0 for service in SERVICES}
+        self._tranco_list = None
+
+    def route(self, method, path, query, body):
+        """Returns (service, status, payload) for a request."""
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        service = parts[0] if parts else ""
+        rest = parts[1:]
+        args = {key: values[0] for key, values in parse_qs(query).items()}
+
+        if service == "ipapi" and method == "POST":
+            return service, *ipapi(json.loads(body or b"[]"))
+        if service == "internetdb" and rest:
+            return service, *internetdb(rest[0])
+        if service == "threatfox" and method == "POST":
+            return service, *threatfox(json.loads(body or b"{}"))
+        if service == "tranco" and rest[:2] == ["ranks", "domain"] and len(rest) > 2:
+            return service, *tranco_rank(rest[2])
+        if service == "tranco" and rest and rest[0].endswith(".zip"):
+            if self._tranco_list is None:
+                self._tranco_list = tranco_list()
+            return "feeds", 200, self._tranco_list
+        if service == "xposedornot" and rest[:1] == ["check-email"] and len(rest) > 1:
+            return service, *check_email(rest[1])
+        if service == "xposedornot" and rest[:1] == ["breaches"]:
+            return service, *breach_catalog()
+        if service == "xposedornot" and rest[:1] == ["breach-analytics"]:
+            return service, *breach_analytics(args.get("email", ""))
+        if service == "numverify":
+            return service, *numverify(args.get("number", ""))
+        if service == "sites" and len(rest) >= 2:
+            return service, *site(rest[0], rest[1])
+        if service == "feeds" and rest and rest[0] in FEEDS:
+            return "feeds", 200, FEEDS[rest[0]]
+        if service == "_stats":
+            return "feeds", 200, {"requests": self.counts, "errors": self.errors}
+        return "feeds", 404, {"error": f"no mock for {method} {path}"}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        service, status, payload = self.route(
+            scope["method"], scope["path"], scope.get("query_string", b"").decode(), body
+        )
+        profile = self.profiles.get(service, self.profiles["feeds"])
+        if service in self.counts:
+            self.counts[service] += 1
+
+        delay = max(0.0, random.gauss(profile.latency, profile.jitter)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+
+        if profile.error_rate and random.random() < profile.error_rate:
+            self.errors[service] += 1
+            status, payload = 503, {"error": "mock upstream error"}
+        elif profile.body_size and isinstance(payload, dict):
+            payload = {**payload, "padding": "x" * profile.body_size}
+        elif profile.body_size and isinstance(payload, str) and payload.startswith("<html>"):
+            payload = payload.replace("</body>", f"<!-- {'x' * profile.body_size} --></body>")
+
+        if isinstance(payload, bytes):
+            content, content_type = payload, b"application/zip"
+        elif isinstance(payload, str):
+            content = payload.encode()
+            content_type = b"text/html" if payload.startswith("<html>") else b"text/plain"
+        else:
+            content, content_type = json.dumps(payload).encode(), b"application/json"
+
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type), (b"content-length", str(len(content)).encode())]})
+        await send({"type": "http.response.body", "body": content})
+
+
+class MockDNS(asyncio.DatagramProtocol):
+    """Answers every A query with two addresses derived from the name."""
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        import dns.message
+        import dns.rdatatype
+        import dns.rrset
+
+        query = dns.message.from_wire(data)
+        response = dns.message.make_response(query)
+        for question in query.question:
+            if question.rdtype == dns.rdatatype.A:
+                seed = _seed(question.name.to_text())
+                addresses = [f"10.{(seed >> 8) & 255}.{(seed >> 16) & 255}.{(seed >> (24 + 8 * i)) & 255 or 1}"
+                             for i in range(2)]
+                response.answer.append(dns.rrset.from_text_list(question.name, 300, "IN", "A", addresses))
+        self.transport.sendto(response.to_wire(), addr)
+
+
+# Providers the backend rate limits (providers/governance.py)
+GOVERNED = ("ipapi", "internetdb", "threatfox", "tranco", "xposedornot", "numverify")
+
+
+def app_env(host, port, dns_port, real_limits=False):
+    """
+    Environment pointing the backend at the mocks. Unless `real_limits`,
+    the free-tier rate limits are lifted so runs measure the app rather
+    than the token buckets.
+    """
+    base = f"http://{host}:{port}"
+    env = {} if real_limits else {
+        f"PROVIDER_{name.upper()}_{setting}": value
+        for name in GOVERNED
+        for setting, value in (("RATE", "100000"), ("BURST", "100000"), ("CONCURRENCY", "256"))
+    }
+    return {
+        **env,
+        "IPAPI_URL": f"{base}/ipapi/batch",
+        "GEOIP_API_FALLBACK": "true",
+        "INTERNETDB_URL": f"{base}/internetdb/",
+        "THREATFOX_URL": f"{base}/threatfox/",
+        "TRANCO_API_URL": f"{base}/tranco/ranks/domain/",
+        "TRANCO_LIST_URL": f"{base}/tranco/top-1m.csv.zip",
+        "XPOSEDORNOT_URL": f"{base}/xposedornot/",
+        "NUMVERIFY_URL": f"{base}/numverify/validate",
+        "NUMVERIFY_API_KEY": "bench",
+        "SAGEMODE_SITES_URL": f"{base}/sites",
+        "TALOS_URL": f"{base}/feeds/talos",
+        "TOR_EXIT_URL": f"{base}/feeds/tor",
+        "PSL_URL": f"{base}/feeds/psl",
+        "DNS_NAMESERVERS": f"{host}:{dns_port}",
+    }
+
+
+def add_profile_arguments(parser):
+    help_suffix = "ms; repeat as SERVICE=VALUE for per-service overrides"
+    parser.add_argument("--latency", action="append", help=f"mean upstream latency, {help_suffix}")
+    parser.add_argument("--jitter", action="append", help=f"latency standard deviation, {help_suffix}")
+    parser.add_argument("--error-rate", action="append", help="fraction of 503 answers (SERVICE=VALUE allowed)")
+    parser.add_argument("--body-size", action="append", help="padding bytes per answer (SERVICE=VALUE allowed)")
+
+
+async def serve(host, port, dns_port, profiles):
+    import uvicorn
+
+    loop = asyncio.get_running_loop()
+    await loop.create_datagram_endpoint(MockDNS, local_addr=(host, dns_port))
+    config = uvicorn.Config(MockUpstreams(profiles), host=host, port=port, log_level="warning",
+                            access_log=False, backlog=4096)
+    await uvicorn.Server(config).serve()
+
+
+def main():
+    parser = ArgumentParser(description="Serve local stand-ins for the backend's upstream APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--dns-port", type=int, default=18053)
+    parser.add_argument("--print-env", action="store_true", help="print the app environment and exit")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.print_env:
+        for key, value in app_env(args.host, args.port, args.dns_port).items():
+            print(f"export {key}={value}")
+        return
+
+    profiles = profiles_from_args(args)
+    print(f"mock upstreams on http://{args.host}:{args.port}, DNS on udp/{args.dns_port}", file=sys.stderr)
+    asyncio.run(serve(args.host, args.port, args.dns_port, profiles))
+
+
+if __name__ == "__main__":
+    main()
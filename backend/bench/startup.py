@@ -0,0 +1,62 @@
+"""
+Startup benchmark.
+
+Imports each app module in a fresh interpreter several times and reports
+wall-clock import time, plus the slowest imports from `-X importtime`.
+
+    python bench/startup.py            # main and asgi, 5 runs each
+    python bench/startup.py main -n 10
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def time_import(module):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=SRC, check=True)
+    return time.perf_counter() - started
+
+
+def slowest_imports(module, top):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC, check=True, capture_output=True, text=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            rows.append((int(cumulative), name.strip()))
+        except ValueError:
+            # header row
+            continue
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = ArgumentParser(description="Measure app import/startup time")
+    parser.add_argument("modules", nargs="*", default=["main", "asgi"])
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        # Warm the bytecode cache so we time imports, not compilation
+        time_import(module)
+        timings = [time_import(module) for _ in range(args.runs)]
+        print(f"{module}: median {statistics.median(timings) * 1000:.0f} ms, "
+              f"min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms over {args.runs} runs")
+        for cumulative, name in slowest_imports(module, args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# Production launcher for the ASGI app (src/asgi.py).
+#
+#   gunicorn -c gunicorn.conf.py asgi:app
+#
+# Every setting can be overridden through the environment.
+import multiprocessing
+import os
+
+pythonpath = "src"
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Each worker runs its own event loop, so one per core is enough to keep
+# thousands of upstream lookups in flight.
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Workers size their file analysis pools (ANALYSIS_WORKERS) from this
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Username enumeration fans out to ~150 sites; leave headroom over the
+# slowest upstream before the arbiter kills a worker.
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Recycle workers periodically to bound memory growth.
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
@@ -0,0 +1,338 @@
+"""
+ASGI entry point.
+
+Serves the same API as main.py on an event loop: upstream lookups are
+awaited concurrently on a shared connection pool instead of holding a
+thread each, and CPU/file-bound work (PE parsing, PageRank, local feed
+lookups) is pushed to worker threads.
+
+    gunicorn -c gunicorn.conf.py asgi:app
+"""
+import asyncio
+import os
+import re
+import tempfile
+
+from dotenv import load_dotenv
+from quart import Quart, g, jsonify, request
+from quart_cors import cors
+
+from http_client import close_async_client, get_async_client
+from providers import registry
+import scanner
+import telemetry
+from providers.governance import governor, ProviderUnavailable
+from risk.scoring import calculate_risk_score
+from store.history import history
+from validators import IP_REGEX, URL_REGEX, EMAIL_REGEX, PHONE_REGEX
+
+load_dotenv()
+
+app = Quart(__name__)
+app = cors(
+    app,
+    allow_origin=["http://localhost:5173", "https://recongraphy.vercel.app"],
+    allow_credentials=True,
+    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+)
+
+
+@app.before_request
+async def start_trace():
+    g.trace = telemetry.start_request()
+
+
+@app.after_request
+async def finish_trace(response):
+    telemetry.finish_request(request.endpoint, response.status_code, g.get("trace"))
+    return response
+
+
+@app.after_serving
+async def shutdown():
+    await close_async_client()
+
+
+@app.route('/')
+async def home():
+    return "Welcome to the ReconGraph"
+
+
+@app.route('/scan', methods=['POST'])
+async def scan():
+    try:
+        body = await request.get_json()
+        if not body or 'query' not in body:
+            return jsonify({"error": "No query provided in request body"}), 400
+
+        ip_or_domain = body.get('query')
+        if not ip_or_domain:
+            return jsonify({"error": "Empty query provided"}), 400
+
+        client = get_async_client()
+        if re.match(IP_REGEX, ip_or_domain):
+            input_type = 'ip'
+            results = await scanner.scan_ip_async(ip_or_domain, client)
+        elif re.match(URL_REGEX, ip_or_domain):
+            input_type = 'domain'
+            try:
+                results = await scanner.scan_domain_async(ip_or_domain, client)
+            except scanner.ResolutionError:
+                return jsonify({"error": f"Unable to resolve domain: {ip_or_domain}"}), 400
+        else:
+            return jsonify({"error": "Invalid IP or domain format"}), 400
+
+        results["risk"] = calculate_risk_score(results)
+
+        history.record(ip_or_domain, input_type, "scan", results)
+
+        if telemetry.wants_timings(request.args, body):
+            return jsonify({**results, "timings": g.trace.summary()})
+        return jsonify(results)
+
+    except Exception as e:
+        print(f"Unexpected error in scan endpoint: {str(e)}")
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+
+
+@app.route('/footprint', methods=['POST'])
+async def footprint():
+    body = await request.get_json()
+    query = body.get('query') if body else None
+
+    if not query:
+        return jsonify({"error": "No IP or domain provided."}), 400
+
+    client = get_async_client()
+    results = {}
+
+    try:
+        if re.match(EMAIL_REGEX, query):
+            input_type = 'email'
+            results["email_scan"] = await registry.acall("xposedornot", query, client)
+        elif re.match(PHONE_REGEX, query):
+            input_type = 'phone'
+            results["phone_scan"] = await registry.acall("numverify", query, client)
+        else:
+            input_type = 'username'
+            results["username_scan"] = await registry.acall("sagemode", query, client)
+    except ProviderUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+
+    history.record(query, input_type, "footprint", results)
+
+    if telemetry.wants_timings(request.args, body):
+        return jsonify({**results, "timings": g.trace.summary()})
+    return jsonify(results)
+
+
+@app.route('/footprint/usernames', methods=['POST'])
+async def footprint_usernames():
+    from osint.username import BatchSearch, expand_usernames, ndjson_async
+
+    body = await request.get_json(silent=True) or {}
+    usernames = body.get('usernames')
+    if not isinstance(usernames, list) or not usernames:
+        return jsonify({"error": "No usernames provided."}), 400
+
+    try:
+        usernames = expand_usernames(usernames, with_variants=bool(body.get('variants')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    search = BatchSearch(usernames, found_only=body.get('found_only', True) is not False)
+    return ndjson_async(search, get_async_client()), 200, {"Content-Type": "application/x-ndjson"}
+
+
+@app.route('/footprint/emails', methods=['POST'])
+async def footprint_emails():
+    from osint.xposedornot import MAX_BATCH, checkEmails_async
+
+    body = await request.get_json(silent=True) or {}
+    emails = body.get('emails')
+    if not isinstance(emails, list) or not emails:
+        return jsonify({"error": "No emails provided."}), 400
+    invalid = [email for email in emails if not isinstance(email, str) or not re.match(EMAIL_REGEX, email)]
+    if invalid:
+        return jsonify({"error": "Invalid email addresses", "invalid": invalid[:20]}), 400
+    if len(emails) > MAX_BATCH:
+        return jsonify({"error": f"Too many emails ({len(emails)}), the limit is {MAX_BATCH}"}), 400
+
+    return jsonify(await checkEmails_async(emails, get_async_client(), analytics=bool(body.get('analytics'))))
+
+
+@app.route('/footprint/phones', methods=['POST'])
+async def footprint_phones():
+    from osint.phone import MAX_BATCH, validate_phone_numbers_async
+
+    body = await request.get_json(silent=True) or {}
+    numbers = body.get('numbers')
+    if not isinstance(numbers, list) or not numbers or not all(isinstance(number, str) for number in numbers):
+        return jsonify({"error": "No phone numbers provided."}), 400
+    if len(numbers) > MAX_BATCH:
+        return jsonify({"error": f"Too many phone numbers ({len(numbers)}), the limit is {MAX_BATCH}"}), 400
+
+    return jsonify(await validate_phone_numbers_async(numbers, get_async_client(), body.get('country_code')))
+
+
+@app.route('/providers', methods=['GET'])
+async def providers_list():
+    return jsonify([provider.describe() for provider in registry.PROVIDERS.values()])
+
+
+@app.route('/providers/status', methods=['GET'])
+async def providers_status():
+    return jsonify(governor.status())
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    return telemetry.metrics.render(), 200, {"Content-Type": telemetry.CONTENT_TYPE}
+
+
+@app.route('/history', methods=['GET'])
+async def scan_history():
+    args = request.args
+    try:
+        rows = await asyncio.to_thread(
+            history.query,
+            ioc=args.get('ioc'),
+            since=args.get('since', type=float),
+            until=args.get('until', type=float),
+            asn=args.get('asn'),
+            country=args.get('country'),
+            cve=args.get('cve'),
+            risk_level=args.get('risk_level'),
+            kind=args.get('kind'),
+            limit=min(args.get('limit', 100, type=int), 1000),
+            include_result=args.get('full', 'true').lower() != 'false',
+        )
+    except Exception as e:
+        print(f"Error querying scan history: {str(e)}")
+        return jsonify({"error": f"Error querying scan history: {str(e)}"}), 500
+    return jsonify({"count": len(rows), "results": rows})
+
+
+@app.route('/history/diff', methods=['GET'])
+async def scan_history_diff():
+    ioc = request.args.get('ioc')
+    if not ioc:
+        return jsonify({"error": "No ioc provided"}), 400
+    return jsonify(await asyncio.to_thread(history.diff, ioc))
+
+
+@app.route("/capa_analyze", methods=["POST", "OPTIONS"])
+async def upload_file():
+    if request.method == "OPTIONS":
+        return "", 200
+
+    files = await request.files
+    if "file" not in files:
+        return jsonify({"error": "No file part"}), 400
+
+    uploads = [file for file in files.getlist("file") if file.filename != ""]
+    if not uploads:
+        return jsonify({"error": "No selected file"}), 400
+
+    from file.batch import MAX_MEMBER_SIZE, BatchAnalysis, is_archive, ndjson
+
+    temp_file_paths = []
+    try:
+        for file in uploads:
+            temp_file_path = os.path.join(tempfile.gettempdir(), f"analysis_{os.urandom(8).hex()}")
+            temp_file_paths.append(temp_file_path)
+            await file.save(temp_file_path)
+
+        multi = request.args.get('multi', 'false').lower() in ('1', 'true')
+        if multi or len(uploads) > 1 or await asyncio.to_thread(is_archive, temp_file_paths[0]):
+            analysis = BatchAnalysis(
+                list(zip(temp_file_paths, [file.filename for file in uploads])),
+                run_capa=request.args.get('capa', 'false').lower() in ('1', 'true'),
+            )
+            paths, temp_file_paths = temp_file_paths, []
+
+            async def generate():
+                try:
+                    lines = ndjson(analysis)
+                    # Archive reading and waiting on workers block; run them off the loop
+                    while True:
+                        line = await asyncio.to_thread(next, lines, None)
+                        if line is None:
+                            break
+                        yield line
+                finally:
+                    for path in paths:
+                        os.unlink(path)
+
+            return generate(), 200, {"Content-Type": "application/x-ndjson"}
+
+        if os.path.getsize(temp_file_paths[0]) > MAX_MEMBER_SIZE:
+            return jsonify({"error": f"File is larger than {MAX_MEMBER_SIZE} bytes"}), 413
+
+        from file.pe import analyze_pe
+
+        analysis_result = await asyncio.to_thread(analyze_pe, temp_file_paths[0], uploads[0].filename)
+
+        return jsonify(analysis_result)
+
+    except Exception as e:
+        print(f"Error during analysis: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        for temp_file_path in temp_file_paths:
+            if os.path.exists(temp_file_path):
+                try:
+                    os.unlink(temp_file_path)
+                except Exception as e:
+                    print(f"Error cleaning up temp file: {str(e)}")
+
+
+@app.route('/ingest', methods=['POST'])
+async def ingest():
+    files = await request.files
+    if "file" not in files:
+        return jsonify({"error": "No file part"}), 400
+
+    file = files["file"]
+    if file.filename == "":
+        return jsonify({"error": "No selected file"}), 400
+
+    from pipeline.ingest import Pipeline, ndjson, open_upload
+
+    temp_file_path = os.path.join(tempfile.gettempdir(), f"ingest_{os.urandom(8).hex()}")
+    await file.save(temp_file_path)
+    pipeline = Pipeline(remote=request.args.get('remote', 'false').lower() in ('1', 'true'))
+
+    async def generate():
+        try:
+            with open(temp_file_path, "rb") as f:
+                lines = ndjson(pipeline, open_upload(f, file.filename))
+                # Extraction and enrichment are blocking; run each batch off the loop
+                while True:
+                    batch = await asyncio.to_thread(next, lines, None)
+                    if batch is None:
+                        break
+                    yield batch
+        finally:
+            os.unlink(temp_file_path)
+
+    return generate(), 200, {"Content-Type": "application/x-ndjson"}
+
+
+def _pagerank(nodes, edges):
+    import networkx as nx
+
+    G = nx.DiGraph()
+    for node in nodes:
+        G.add_node(node['id'])
+    for edge in edges:
+        G.add_edge(edge['source'], edge['target'])
+    return nx.pagerank(G, alpha=0.85)
+
+
+@app.route('/pagerank', methods=['POST'])
+async def pagerank():
+    data = await request.get_json()
+    pr = await asyncio.to_thread(_pagerank, data.get('nodes', []), data.get('edges', []))
+    return jsonify({'pagerank': pr})
@@ -0,0 +1,276 @@
+"""
+Offline IP -> geo/ASN lookup.
+
+Range databases are imported into sorted arrays of range starts/ends (IPv4
+mapped into IPv6, stored as 16-byte big-endian keys so byte order matches
+numeric order) plus an index into a table of distinct records. Records are
+stored as one UTF-8 string blob with an offset per field. All arrays are
+saved as .npy files and memory-mapped, so workers share them through the
+page cache and a lookup is a single binary search.
+
+Supported imports:
+
+- ip2asn: the iptoasn.com TSV (range_start, range_end, AS_number,
+  country_code, AS_description)
+- dbip-city: the DB-IP lite city CSV (ip_start, ip_end, continent, country,
+  stateprov, city, latitude, longitude)
+
+    python -m attack.geoip import ip2asn ip2asn-combined.tsv.gz
+    python -m attack.geoip import dbip-city dbip-city-lite-2024-01.csv.gz
+    python -m attack.geoip lookup 8.8.8.8
+"""
+import csv
+import gzip
+import io
+import ipaddress
+import json
+import os
+import threading
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+database_location = os.getenv("GEOIP_DB_PATH", "media/geoip")
+
+TABLES = ("asn", "geo")
+FORMATS = {
+    # format: (table, delimiter, record fields taken from columns 2..)
+    "ip2asn": ("asn", "\t", ("asn", "country_code", "as_name")),
+    "dbip-city": ("geo", ",", ("continent", "country_code", "region", "city", "lat", "lon")),
+}
+# Seconds between checks for a re-imported database
+RELOAD_INTERVAL = 60.0
+
+
+def ip_key(ip) -> bytes:
+    address = ipaddress.ip_address(ip) if isinstance(ip, str) else ip
+    if address.version == 4:
+        address = ipaddress.IPv6Address(b"\x00" * 10 + b"\xff\xff" + address.packed)
+    return address.packed
+
+
+def _paths(prefix, table):
+    base = f"{prefix}.{table}"
+    return (
+        f"{base}.starts.npy", f"{base}.ends.npy", f"{base}.index.npy",
+        f"{base}.strings.npy", f"{base}.offsets.npy", f"{base}.meta.json",
+    )
+
+
+def _pack_records(records):
+    """
+    Flatten records into a UTF-8 blob and the offsets of each field in it;
+    field j of record i spans blob[offsets[k]:offsets[k + 1]], k = i * n_fields + j.
+    """
+    encoded = [value.encode("utf-8") for record in records for value in record]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum(np.fromiter((len(value) for value in encoded), dtype=np.uint64, count=len(encoded)), out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", errors="ignore")
+    return open(path, "r", encoding="utf-8", errors="ignore")
+
+
+def import_database(fmt, source, prefix=None):
+    """
+    Import a range database into the memory-mapped table for its format.
+
+    Returns:
+        dict: Number of ranges and distinct records imported.
+    """
+    if fmt not in FORMATS:
+        raise Exception(f"not supported database format {fmt}. Supported are: {', '.join(FORMATS)}")
+    table, delimiter, fields = FORMATS[fmt]
+    prefix = prefix or database_location
+    started = time.time()
+
+    ranges = []
+    records = []
+    record_ids = {}
+    with _open(source) as f:
+        for row in csv.reader(f, delimiter=delimiter):
+            if len(row) < 2 + len(fields):
+                continue
+            try:
+                start, end = ip_key(row[0].strip()), ip_key(row[1].strip())
+            except ValueError:
+                # header or malformed line
+                continue
+            values = tuple(value.strip() for value in row[2:2 + len(fields)])
+            # ip2asn marks unrouted space with AS 0
+            if fmt == "ip2asn" and values[0] == "0":
+                continue
+            record_id = record_ids.get(values)
+            if record_id is None:
+                record_id = record_ids[values] = len(records)
+                records.append(values)
+            ranges.append((start, end, record_id))
+
+    ranges.sort()
+    starts = np.array([r[0] for r in ranges], dtype="S16")
+    ends = np.array([r[1] for r in ranges], dtype="S16")
+    index = np.array([r[2] for r in ranges], dtype=np.uint32)
+    strings, offsets = _pack_records(records)
+
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    starts_path, ends_path, index_path, strings_path, offsets_path, meta_path = _paths(prefix, table)
+    for path, array in (
+        (starts_path, starts), (ends_path, ends), (index_path, index), (strings_path, strings), (offsets_path, offsets)
+    ):
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(f"{path}.tmp", path)
+    # Meta goes last: readers reload when this file changes
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"fields": fields, "records": len(records), "imported_at": time.time()}, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+    print(f"geoip {table} table imported: {len(ranges)} ranges, {len(records)} records in {time.time() - started:.1f}s")
+    return {"table": table, "ranges": len(ranges), "records": len(records)}
+
+
+class RangeTable:
+    def __init__(self, prefix, table):
+        self.prefix = prefix
+        self.table = table
+        self.starts = self.ends = self.index = None
+        self.strings = self.offsets = None
+        self.fields = ()
+        self._loaded_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            starts_path, ends_path, index_path, strings_path, offsets_path, meta_path = _paths(self.prefix, self.table)
+            try:
+                mtime = os.path.getmtime(meta_path)
+            except OSError:
+                return
+            if mtime == self._loaded_mtime:
+                return
+            try:
+                starts = np.load(starts_path, mmap_mode="r")
+                ends = np.load(ends_path, mmap_mode="r")
+                index = np.load(index_path, mmap_mode="r")
+                strings = np.load(strings_path, mmap_mode="r")
+                offsets = np.load(offsets_path, mmap_mode="r")
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except Exception as e:
+                print(f"Error loading geoip {self.table} table: {str(e)}")
+                return
+            if not len(starts) == len(ends) == len(index):
+                return
+            if len(offsets) != meta["records"] * len(meta["fields"]) + 1:
+                return
+            self.starts, self.ends, self.index = starts, ends, index
+            self.strings, self.offsets = strings, offsets
+            self.fields = tuple(meta["fields"])
+            self._loaded_mtime = mtime
+
+    def _record(self, record_id):
+        base = record_id * len(self.fields)
+        bounds = [int(offset) for offset in self.offsets[base:base + len(self.fields) + 1]]
+        raw = self.strings[bounds[0]:bounds[-1]].tobytes()
+        return {
+            field: raw[start - bounds[0]:end - bounds[0]].decode("utf-8")
+            for field, start, end in zip(self.fields, bounds, bounds[1:])
+        }
+
+    @property
+    def available(self):
+        self._maybe_reload()
+        return self.starts is not None
+
+    def lookup(self, key: bytes):
+        self._maybe_reload()
+        if self.starts is None or not len(self.starts):
+            return None
+        i = int(np.searchsorted(self.starts, np.bytes_(key), side="right")) - 1
+        if i < 0 or self.ends[i] < np.bytes_(key):
+            return None
+        return self._record(int(self.index[i]))
+
+
+class GeoIP:
+    def __init__(self, prefix=None):
+        prefix = prefix or database_location
+        self.tables = {table: RangeTable(prefix, table) for table in TABLES}
+
+    @property
+    def available(self):
+        return any(table.available for table in self.tables.values())
+
+    def lookup(self, ip: str) -> dict:
+        """
+        Look `ip` up in every imported table.
+
+        Returns:
+            dict: In the shape of an ip-api batch entry, so /scan's
+                `ip_info` contract is unchanged.
+        """
+        key = ip_key(ip)
+        asn = self.tables["asn"].lookup(key) or {}
+        geo = self.tables["geo"].lookup(key) or {}
+        if not asn and not geo:
+            return {"status": "fail", "message": "not found", "query": ip}
+
+        country_code = geo.get("country_code") or asn.get("country_code") or ""
+        as_name = asn.get("as_name", "")
+        result = {
+            "status": "success",
+            "query": ip,
+            # No country-name table ships with the databases; the code
+            # is the most precise value we have.
+            "country": country_code,
+            "countryCode": country_code,
+            "region": "",
+            "regionName": geo.get("region", ""),
+            "city": geo.get("city", ""),
+            "zip": "",
+            "timezone": "",
+            "isp": as_name,
+            "org": as_name,
+            "as": f"AS{asn['asn']} {as_name}".strip() if asn.get("asn") else "",
+        }
+        if geo.get("lat") and geo.get("lon"):
+            result["lat"] = float(geo["lat"])
+            result["lon"] = float(geo["lon"])
+        return result
+
+
+geoip = GeoIP()
+
+
+def main():
+    parser = ArgumentParser(description="Import or query the offline GeoIP/ASN database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    importer = subparsers.add_parser("import")
+    importer.add_argument("format", choices=sorted(FORMATS))
+    importer.add_argument("source", help="database file, optionally gzipped")
+    lookup = subparsers.add_parser("lookup")
+    lookup.add_argument("ip")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        print(import_database(args.format, args.source))
+    else:
+        print(json.dumps(geoip.lookup(args.ip), indent=4))
+
+
+if __name__ == "__main__":
+    main()
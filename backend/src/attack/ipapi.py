@@ -1,30 +1,65 @@
 from dotenv import load_dotenv
 import requests
 import os
+
+from attack.geoip import geoip
+from http_client import TIMEOUT
+from providers.governance import governor
+
 load_dotenv()
 
 api_key = os.getenv("ipAPI_KEY")
-batch_url = "http://ip-api.com/batch"
-dns_url = "http://edns.ip-api.com/json"
+batch_url = os.getenv("IPAPI_URL", "http://ip-api.com/batch")
 
+# Query ip-api when no local GeoIP database has been imported. Off by
+# default: ipapi is registered as a local (cost 0) provider, which /ingest
+# uses without --remote.
+API_FALLBACK = os.getenv("GEOIP_API_FALLBACK", "false").lower() in ("1", "true")
 
-def ipapi(ip_addr):
-    IP = [
+
+def _payload(ip_addr):
+    return [
             {
                 "query": ip_addr,
-                "fields": "status,message,country,countryCode,region,regionName,city,zip,timezone,isp,org,as",
+                "fields": "status,message,query,country,countryCode,region,regionName,city,zip,timezone,isp,org,as",
                 "lang" : "us",
             }
         ]
 
-    response_batch = requests.post(batch_url, json=IP)
+
+def _local(ip_addr):
+    if geoip.available:
+        return {"ip_info": [geoip.lookup(ip_addr)]}
+    return {"ip_info": [{"status": "fail", "message": "GeoIP database is not imported yet", "query": ip_addr}]}
+
+
+def ipapi(ip_addr):
+    if geoip.available or not API_FALLBACK:
+        return _local(ip_addr)
+
+    return governor.call("ipapi", ip_addr, _api, ip_addr)
+
+
+async def ipapi_async(ip_addr, client):
+    if geoip.available or not API_FALLBACK:
+        return _local(ip_addr)
+
+    return await governor.acall("ipapi", ip_addr, lambda: _api_async(ip_addr, client))
+
+
+def _api(ip_addr):
+    response_batch = requests.post(batch_url, json=_payload(ip_addr), timeout=TIMEOUT)
     response_batch.raise_for_status()
 
-    response_dns = requests.get(dns_url)
-    response_dns.raise_for_status()
+    return {"ip_info": response_batch.json()}
+
+
+async def _api_async(ip_addr, client):
+    response_batch = await client.post(batch_url, json=_payload(ip_addr))
+    response_batch.raise_for_status()
 
-    response = {"ip_info": response_batch.json(), "dns_info": response_dns.json()}
+    return {"ip_info": response_batch.json()}
 
-    return response
 
-print(ipapi("198.98.51.189"))
\ No newline at end of file
+if __name__ == "__main__":
+    print(ipapi("198.98.51.189"))
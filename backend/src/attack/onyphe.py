@@ -36,4 +36,6 @@ def onphe(query:str , type:str):
 
     return response.json()
 
-print(onphe("aegisclub.tech", "domain"))
\ No newline at end of file
+
+if __name__ == "__main__":
+    print(onphe("aegisclub.tech", "domain"))
@@ -0,0 +1,166 @@
+"""
+Caching DNS resolver.
+
+A and AAAA records are queried concurrently with a per-query timeout and
+cached for the record TTL (clamped to [DNS_MIN_TTL, DNS_MAX_TTL]). NXDOMAIN
+and empty answers are cached for DNS_NEGATIVE_TTL. Point DNS_NAMESERVERS at
+a local stub server (e.g. "127.0.0.1:5353") to test without the network.
+"""
+import asyncio
+import os
+import threading
+import time
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+from dotenv import load_dotenv
+
+import telemetry
+
+load_dotenv()
+
+TIMEOUT = float(os.getenv("DNS_TIMEOUT", "2"))
+MIN_TTL = int(os.getenv("DNS_MIN_TTL", "30"))
+MAX_TTL = int(os.getenv("DNS_MAX_TTL", "3600"))
+NEGATIVE_TTL = int(os.getenv("DNS_NEGATIVE_TTL", "60"))
+CACHE_SIZE = int(os.getenv("DNS_CACHE_SIZE", "50000"))
+
+RECORD_TYPES = ("A", "AAAA")
+
+
+class ResolutionError(Exception):
+    pass
+
+
+def _nameservers():
+    """Parse DNS_NAMESERVERS ("1.1.1.1,127.0.0.1:5353") into (hosts, port)."""
+    value = os.getenv("DNS_NAMESERVERS", "").strip()
+    if not value:
+        return None, 53
+    hosts = []
+    port = 53
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        # IPv6 nameservers are written as [::1]:5353
+        if entry.startswith("["):
+            host, _, rest = entry[1:].partition("]")
+            if rest.startswith(":"):
+                port = int(rest[1:])
+        elif entry.count(":") == 1:
+            host, port = entry.split(":")
+            port = int(port)
+        else:
+            host = entry
+        hosts.append(host)
+    return hosts, port
+
+
+class Resolver:
+    def __init__(self, nameservers=None, port=None, timeout=TIMEOUT):
+        if nameservers is None:
+            nameservers, default_port = _nameservers()
+            port = port or default_port
+        self.timeout = timeout
+        self._config = (nameservers, port or 53)
+        self._resolver = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _get_resolver(self):
+        # Built on first use: reading /etc/resolv.conf at import time would
+        # make importing the app fail on hosts without one.
+        if self._resolver is None:
+            nameservers, port = self._config
+            resolver = dns.asyncresolver.Resolver(configure=nameservers is None)
+            if nameservers is not None:
+                resolver.nameservers = nameservers
+            resolver.port = port
+            resolver.timeout = self.timeout
+            resolver.lifetime = self.timeout
+            self._resolver = resolver
+        return self._resolver
+
+    def _cached(self, name, rdtype):
+        with self._lock:
+            entry = self._cache.get((name, rdtype))
+            if entry is None:
+                return None
+            expires, addresses = entry
+            if expires < time.monotonic():
+                del self._cache[(name, rdtype)]
+                return None
+            return addresses
+
+    def _store(self, name, rdtype, addresses, ttl):
+        with self._lock:
+            if len(self._cache) >= CACHE_SIZE:
+                # Drop the oldest insertions; dicts keep insertion order
+                for key in list(self._cache)[: CACHE_SIZE // 10 or 1]:
+                    del self._cache[key]
+            self._cache[(name, rdtype)] = (time.monotonic() + ttl, addresses)
+
+    async def _query(self, name, rdtype):
+        cached = self._cached(name, rdtype)
+        if cached is not None:
+            return cached
+
+        try:
+            answer = await asyncio.wait_for(
+                self._get_resolver().resolve(name, rdtype, raise_on_no_answer=False), timeout=self.timeout
+            )
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoNameservers):
+            self._store(name, rdtype, [], NEGATIVE_TTL)
+            return []
+        except (asyncio.TimeoutError, dns.exception.Timeout):
+            # Not cached: the next request should retry
+            raise ResolutionError(f"timed out resolving {rdtype} for {name}")
+
+        if answer.rrset is None:
+            self._store(name, rdtype, [], NEGATIVE_TTL)
+            return []
+        addresses = [record.to_text() for record in answer.rrset]
+        ttl = min(max(answer.rrset.ttl, MIN_TTL), MAX_TTL)
+        self._store(name, rdtype, addresses, ttl)
+        return addresses
+
+    async def resolve(self, name: str) -> dict:
+        """
+        Resolve A and AAAA records concurrently.
+
+        Returns:
+            dict: {"A": [...], "AAAA": [...]}
+
+        Raises:
+            ResolutionError: when no address could be resolved.
+        """
+        name = name.strip().lower().rstrip(".")
+        with telemetry.span("dns"):
+            outcomes = await asyncio.gather(
+                *(self._query(name, rdtype) for rdtype in RECORD_TYPES), return_exceptions=True
+            )
+            records = {}
+            errors = []
+            for rdtype, outcome in zip(RECORD_TYPES, outcomes):
+                if isinstance(outcome, Exception):
+                    errors.append(str(outcome))
+                    records[rdtype] = []
+                else:
+                    records[rdtype] = outcome
+            if not any(records.values()):
+                raise ResolutionError("; ".join(errors) or f"no A/AAAA records for {name}")
+        return records
+
+    def resolve_sync(self, name: str) -> dict:
+        """resolve() for synchronous callers such as the Flask app."""
+        return asyncio.run(self.resolve(name))
+
+
+def addresses(records: dict, limit: int) -> list:
+    """Flatten resolve() output into at most `limit` addresses, IPv4 first."""
+    return [address for rdtype in RECORD_TYPES for address in records.get(rdtype, [])][:limit]
+
+
+resolver = Resolver()
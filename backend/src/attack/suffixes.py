@@ -0,0 +1,126 @@
+"""
+Registrable domain (eTLD+1) lookup from the Public Suffix List.
+
+The list is downloaded to media/ by the Tranco index refresher, or with
+
+    python -m attack.suffixes
+
+Lookups only read the local copy; without it, domains fall back to their
+last two labels.
+"""
+import os
+import sys
+import threading
+
+import requests
+
+from http_client import TIMEOUT
+
+database_location = os.getenv("PSL_PATH", "media/public_suffix_list.dat")
+url = os.getenv("PSL_URL", "https://publicsuffix.org/list/public_suffix_list.dat")
+
+_rules = None
+_lock = threading.Lock()
+
+
+def update():
+    try:
+        print("starting download of public suffix list")
+        r = requests.get(url, timeout=TIMEOUT)
+        r.raise_for_status()
+
+        directory = os.path.dirname(database_location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_location = f"{database_location}.tmp"
+        with open(temp_location, "w", encoding="utf-8") as f:
+            f.write(r.text)
+        os.replace(temp_location, database_location)
+        print("ended download of public suffix list")
+        return True
+    except Exception as e:
+        print(f"Error downloading public suffix list: {str(e)}")
+        return False
+
+
+def available():
+    return os.path.isfile(database_location)
+
+
+def load():
+    """Parsed (exact, wildcard, exception) rules; empty sets until the list is downloaded."""
+    global _rules
+    if _rules is not None:
+        return _rules
+    with _lock:
+        if _rules is not None:
+            return _rules
+
+        exact, wildcard, exception = set(), set(), set()
+        if os.path.isfile(database_location):
+            with open(database_location, "r", encoding="utf-8") as f:
+                for line in f:
+                    rule = line.strip()
+                    if not rule or rule.startswith("//"):
+                        continue
+                    rule = rule.split()[0].lower()
+                    if rule.startswith("!"):
+                        exception.add(rule[1:])
+                    elif rule.startswith("*."):
+                        wildcard.add(rule[2:])
+                    else:
+                        exact.add(rule)
+        # Nothing is kept until a list is on disk, so later lookups pick it up
+        if exact:
+            _rules = (exact, wildcard, exception)
+        return exact, wildcard, exception
+
+
+def refresh():
+    """Re-download the list and drop the parsed rules so the next lookup reloads them."""
+    global _rules
+    if update():
+        with _lock:
+            _rules = None
+
+
+def normalize(domain: str) -> str:
+    domain = domain.strip().lower().rstrip(".")
+    if "://" in domain:
+        domain = domain.split("://", 1)[1]
+    return domain.split("/", 1)[0].split(":", 1)[0]
+
+
+def registrable_domain(domain: str) -> str:
+    """
+    Return the eTLD+1 of `domain`, e.g. "a.b.example.co.uk" -> "example.co.uk".
+    """
+    domain = normalize(domain)
+    labels = domain.split(".")
+    if len(labels) < 2:
+        return domain
+
+    exact, wildcard, exception = load()
+    if not exact:
+        return ".".join(labels[-2:])
+
+    # Walk from the longest candidate suffix down; the first match is the
+    # longest public suffix.
+    suffix_length = 1
+    for i in range(len(labels)):
+        candidate = ".".join(labels[i:])
+        parent = ".".join(labels[i + 1:])
+        if candidate in exception:
+            suffix_length = len(labels) - i - 1
+            break
+        if candidate in exact or parent in wildcard:
+            suffix_length = len(labels) - i
+            break
+
+    if suffix_length >= len(labels):
+        return domain
+    return ".".join(labels[-(suffix_length + 1):])
+
+
+if __name__ == "__main__":
+    sys.exit(0 if update() else 1)
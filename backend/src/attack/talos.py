@@ -1,9 +1,23 @@
+import asyncio
 import os
 
 import requests
 
 database_location = "media/talos.txt"
 
+_entries = frozenset()
+_loaded_mtime = None
+
+def _load():
+    """The list as a set, re-read only when the file on disk changes."""
+    global _entries, _loaded_mtime
+    mtime = os.path.getmtime(database_location)
+    if mtime != _loaded_mtime:
+        with open(database_location, "r", encoding="utf-8") as f:
+            _entries = frozenset(line.strip() for line in f if line.strip())
+        _loaded_mtime = mtime
+    return _entries
+
 def talos(query: str):
         result = {"blacklisted": False}
         if not os.path.isfile(database_location):
@@ -15,19 +29,18 @@ def talos(query: str):
                 f"database location {database_location} does not exist"
             )
 
-        with open(database_location, "r", encoding="utf-8") as f:
-            db = f.read()
-
-        db_list = db.split("\n")
-        if query in db_list:
+        if query in _load():
             result["blacklisted"] = True
 
         return result
 
+async def talos_async(query: str):
+    return await asyncio.to_thread(talos, query)
+
 def update():
     try:
         print("starting download of db from talos")
-        url = "https://snort.org/downloads/ip-block-list"
+        url = os.getenv("TALOS_URL", "https://snort.org/downloads/ip-block-list")
         r = requests.get(url)
         r.raise_for_status()
 
@@ -43,4 +56,6 @@ def update():
 
     return False
 
-print(talos("109.196.187.208"))
\ No newline at end of file
+
+if __name__ == "__main__":
+    print(talos("109.196.187.208"))
@@ -1,16 +1,33 @@
 import json
+import os
 
 import requests
 
+from http_client import TIMEOUT
+
+
+url: str = os.getenv("THREATFOX_URL", "https://threatfox-api.abuse.ch/api/v1/")
+
 
 def threatfox(query : str):
-    url: str = "https://threatfox-api.abuse.ch/api/v1/"
     payload = {"query": "search_ioc", "search_term": query}
 
-    response = requests.post(url, data=json.dumps(payload))
+    response = requests.post(url, data=json.dumps(payload), timeout=TIMEOUT)
+    response.raise_for_status()
+
+    return _parse(response.json())
+
+
+async def threatfox_async(query : str, client):
+    payload = {"query": "search_ioc", "search_term": query}
+
+    response = await client.post(url, content=json.dumps(payload))
     response.raise_for_status()
 
-    result = response.json()
+    return _parse(response.json())
+
+
+def _parse(result):
     data = result.get("data", [])
     if data and isinstance(data, list):
         for index, element in enumerate(data):
@@ -37,5 +54,5 @@ def threatfox(query : str):
             return result
 
 
-
-print(threatfox("62.60.226.62"))
\ No newline at end of file
+if __name__ == "__main__":
+    print(threatfox("62.60.226.62"))
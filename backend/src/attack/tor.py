@@ -1,9 +1,23 @@
+import asyncio
 import os
 import requests
 import re
 
 database_location = "media/tor.txt"
 
+_entries = frozenset()
+_loaded_mtime = None
+
+def _load():
+    """The list as a set, re-read only when the file on disk changes."""
+    global _entries, _loaded_mtime
+    mtime = os.path.getmtime(database_location)
+    if mtime != _loaded_mtime:
+        with open(database_location, "r", encoding="utf-8") as f:
+            _entries = frozenset(line.strip() for line in f if line.strip())
+        _loaded_mtime = mtime
+    return _entries
+
 def tor(query:str):
     result = {"found": False}
     if not os.path.isfile(database_location) and not update():
@@ -14,18 +28,18 @@ def tor(query:str):
             f"database location {database_location} does not exist"
         )
 
-    with open(database_location, "r", encoding="utf-8") as f:
-        db = f.read()
-
-    db_list = db.split("\n")
-    if query in db_list:
+    if query in _load():
         result["found"] = True
 
     return result
+
+async def tor_async(query: str):
+    return await asyncio.to_thread(tor, query)
+
 def update():
     try:  
         print("tor exit nodes download started")
-        url = "https://check.torproject.org/exit-addresses"
+        url = os.getenv("TOR_EXIT_URL", "https://check.torproject.org/exit-addresses")
         r = requests.get(url)
         r.raise_for_status()
 
@@ -45,4 +59,6 @@ def update():
     except Exception as e:
         return False
     
-print(tor("198.98.51.189"))
\ No newline at end of file
+
+if __name__ == "__main__":
+    print(tor("198.98.51.189"))
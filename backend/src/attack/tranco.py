@@ -1,17 +1,60 @@
+import os
+
 import requests
 
+from attack.tranco_index import index
+from http_client import TIMEOUT
+from providers.governance import governor
+
+api_url: str = os.getenv("TRANCO_API_URL", "https://tranco-list.eu/api/ranks/domain/")
+
+# Ask the Tranco API when the local index has no answer
+API_FALLBACK = os.getenv("TRANCO_API_FALLBACK", "false").lower() in ("1", "true")
+
 def tranco(query):
-    url: str = "https://tranco-list.eu/api/ranks/domain/"
+    result = _local(query)
+    if result is not None:
+        return result
+
+    return governor.call("tranco", query, _api, query)
+
+async def tranco_async(query, client):
+    result = _local(query)
+    if result is not None:
+        return result
+
+    return await governor.acall("tranco", query, lambda: _api_async(query, client))
+
+def _local(query):
+    index.start_refresher()
+    rank = index.rank(query)
+    if rank is not None:
+        return {"rank": rank}
+    if API_FALLBACK:
+        return None
+    if index.available:
+        return {"found": False}
+    return {"found": False, "error": "Tranco index is not built yet"}
+
+def _api(query):
     observable_to_analyze = query
-    url = url + observable_to_analyze
+    url = api_url + observable_to_analyze
 
     # Send GET request
-    response = requests.get(url)
+    response = requests.get(url, timeout=TIMEOUT)
     response.raise_for_status()
 
     # Parse JSON from the response
     response_data = response.json()  # Parse JSON into a Python dictionary
 
+    return _parse(response_data)
+
+async def _api_async(query, client):
+    response = await client.get(api_url + query)
+    response.raise_for_status()
+    return _parse(response.json())
+
+def _parse(response_data):
     # Check if "ranks" exists and extract the latest rank
     if response_data.get("ranks"):  # Use .get() to safely access "ranks"
         latest_rank = response_data["ranks"][0]["rank"]  # The first rank is the latest
@@ -22,4 +65,5 @@ def tranco(query):
     return result  # Return the processed result
 
 # Example usage
-print(tranco("wolfram.com"))
\ No newline at end of file
+if __name__ == "__main__":
+    print(tranco("wolfram.com"))
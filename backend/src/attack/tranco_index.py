@@ -0,0 +1,233 @@
+"""
+Local Tranco rank index.
+
+The Tranco top-1M list is downloaded and compiled into two aligned arrays:
+sorted 64-bit domain hashes and their ranks. Both are saved as .npy files
+and memory-mapped, so every worker shares one copy through the page cache.
+A lookup is one hash plus a binary search.
+
+    python -m attack.tranco_index   # build/refresh the index and suffix list now
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+
+import numpy as np
+import requests
+from dotenv import load_dotenv
+
+from attack import suffixes
+from attack.suffixes import normalize, registrable_domain
+from http_client import TIMEOUT
+
+load_dotenv()
+
+list_url = os.getenv("TRANCO_LIST_URL", "https://tranco-list.eu/top-1m.csv.zip")
+index_location = os.getenv("TRANCO_INDEX_PATH", "media/tranco")
+# Rebuild once the index is older than this
+MAX_AGE = float(os.getenv("TRANCO_MAX_AGE_HOURS", "24")) * 3600
+# How often workers check the index files for a newer build
+RELOAD_INTERVAL = 60.0
+
+
+def domain_hash(domain: str) -> int:
+    return int.from_bytes(hashlib.blake2b(domain.encode(), digest_size=8).digest(), "little")
+
+
+def _paths(prefix):
+    return f"{prefix}.hashes.npy", f"{prefix}.ranks.npy", f"{prefix}.meta.json"
+
+
+def build(prefix=None, source=None):
+    """
+    Download (or read `source`) and compile the list into index files.
+
+    Returns:
+        dict: Metadata of the new index.
+    """
+    prefix = prefix or index_location
+    started = time.time()
+    if source is None:
+        print("tranco list download started")
+        response = requests.get(list_url, timeout=max(TIMEOUT, 120))
+        response.raise_for_status()
+        payload = response.content
+    else:
+        with open(source, "rb") as f:
+            payload = f.read()
+
+    if payload[:2] == b"PK":
+        with zipfile.ZipFile(io.BytesIO(payload)) as archive:
+            payload = archive.read(archive.namelist()[0])
+
+    hashes = []
+    ranks = []
+    for row in csv.reader(io.StringIO(payload.decode("utf-8", errors="ignore"))):
+        if len(row) < 2 or not row[0].isdigit():
+            continue
+        hashes.append(domain_hash(normalize(row[1])))
+        ranks.append(int(row[0]))
+
+    hashes = np.array(hashes, dtype=np.uint64)
+    ranks = np.array(ranks, dtype=np.uint32)
+    order = np.argsort(hashes, kind="stable")
+    hashes, ranks = hashes[order], ranks[order]
+
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    hashes_path, ranks_path, meta_path = _paths(prefix)
+    # Write side files first and swap them in atomically; the meta file
+    # goes last because readers use it to detect a new build.
+    for path, array in ((hashes_path, hashes), (ranks_path, ranks)):
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(f"{path}.tmp", path)
+    meta = {"built_at": time.time(), "entries": int(len(hashes)), "source": source or list_url}
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+    print(f"tranco index built: {len(hashes)} domains in {time.time() - started:.1f}s")
+    return meta
+
+
+class TrancoIndex:
+    def __init__(self, prefix=None):
+        self.prefix = prefix or index_location
+        self.hashes = None
+        self.ranks = None
+        self.meta = None
+        self._loaded_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def _meta_mtime(self):
+        try:
+            return os.path.getmtime(_paths(self.prefix)[2])
+        except OSError:
+            return None
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self.hashes is not None and now - self._checked_at < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            mtime = self._meta_mtime()
+            if mtime is None or mtime == self._loaded_mtime:
+                return
+            hashes_path, ranks_path, meta_path = _paths(self.prefix)
+            try:
+                hashes = np.load(hashes_path, mmap_mode="r")
+                ranks = np.load(ranks_path, mmap_mode="r")
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except Exception as e:
+                print(f"Error loading tranco index: {str(e)}")
+                return
+            if len(hashes) != len(ranks):
+                # Caught mid-swap; retry on the next check
+                return
+            self.hashes, self.ranks, self.meta = hashes, ranks, meta
+            self._loaded_mtime = mtime
+
+    @property
+    def available(self):
+        self._maybe_reload()
+        return self.hashes is not None
+
+    def is_stale(self):
+        mtime = self._meta_mtime()
+        return mtime is None or time.time() - mtime > MAX_AGE
+
+    def rank(self, domain: str):
+        """
+        Rank of `domain`, trying the exact host first and then its
+        registrable domain. Returns None when unranked or no index exists.
+        """
+        self._maybe_reload()
+        if self.hashes is None:
+            return None
+
+        host = normalize(domain)
+        candidates = [host]
+        registrable = registrable_domain(host)
+        if registrable != host:
+            candidates.append(registrable)
+
+        for candidate in candidates:
+            h = np.uint64(domain_hash(candidate))
+            i = int(np.searchsorted(self.hashes, h))
+            if i < len(self.hashes) and self.hashes[i] == h:
+                return int(self.ranks[i])
+        return None
+
+    def start_refresher(self, interval=3600.0):
+        """Rebuild the index in a daemon thread whenever it goes stale."""
+        if self._refresher and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, args=(interval,), name="tranco-refresh", daemon=True
+            )
+            self._refresher.start()
+
+    def _refresh_loop(self, interval):
+        while True:
+            if self.is_stale():
+                self.refresh()
+            # Lookups never download the Public Suffix List themselves
+            if not suffixes.available():
+                suffixes.refresh()
+            time.sleep(interval)
+
+    def refresh(self):
+        # One worker rebuilds at a time; the others pick up the new files
+        # through _maybe_reload().
+        lock_path = f"{self.prefix}.lock"
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Clear a lock abandoned by a crashed builder
+            try:
+                if time.time() - os.path.getmtime(lock_path) > 3600:
+                    os.unlink(lock_path)
+            except OSError:
+                pass
+            return False
+        try:
+            os.close(fd)
+            build(self.prefix)
+            suffixes.refresh()
+            self._checked_at = 0.0
+            return True
+        except Exception as e:
+            print(f"Error refreshing tranco index: {str(e)}")
+            return False
+        finally:
+            try:
+                os.unlink(lock_path)
+            except OSError:
+                pass
+
+
+index = TrancoIndex()
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Build the local Tranco rank index")
+    parser.add_argument("--source", help="local top-1m.csv or .zip instead of downloading")
+    args = parser.parse_args()
+    print(build(source=args.source))
+    suffixes.update()
@@ -10,4 +10,6 @@ def whoisripe(query:str):
 
     return response.json()
     
-print(whoisripe("google.com"))
\ No newline at end of file
+
+if __name__ == "__main__":
+    print(whoisripe("google.com"))
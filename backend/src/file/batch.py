@@ -0,0 +1,390 @@
+"""
+Multi-file and archive analysis for /capa_analyze.
+
+Uploaded zip and tar archives are read member by member straight from the
+archive (nested archives included, encrypted zips tried with the usual
+malware-sharing passwords) without extracting anything to disk. Members
+are hashed as they stream in; each distinct SHA-256 is analyzed once in a
+process pool (PE headers, imports and section entropy, YARA when rules
+are configured, capa on request) and results are yielded as they
+complete, followed by an aggregated summary.
+
+    python -m file.batch dropped.zip sample.exe --capa
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Every web worker has its own pool; split the CPUs between them
+WORKERS = int(os.getenv(
+    "ANALYSIS_WORKERS", str(max(1, (os.cpu_count() or 2) // int(os.getenv("WEB_CONCURRENCY", "1"))))
+))
+MAX_MEMBERS = int(os.getenv("ANALYSIS_MAX_MEMBERS", "1000"))
+MAX_MEMBER_SIZE = int(os.getenv("ANALYSIS_MAX_MEMBER_SIZE", str(64 * 1024 * 1024)))
+# Total decompressed bytes per request; guards against zip bombs
+MAX_TOTAL_SIZE = int(os.getenv("ANALYSIS_MAX_TOTAL_SIZE", str(1024 * 1024 * 1024)))
+MAX_DEPTH = int(os.getenv("ANALYSIS_MAX_DEPTH", "2"))
+ARCHIVE_PASSWORDS = [
+    password.encode() for password in os.getenv("ARCHIVE_PASSWORDS", "infected,malware,virus").split(",") if password
+]
+YARA_RULES_PATH = os.getenv("YARA_RULES_PATH", "")
+YARA_TIMEOUT = int(os.getenv("YARA_TIMEOUT", "60"))
+# "spawn" keeps forked copies of server threads and sockets out of the workers
+START_METHOD = os.getenv("ANALYSIS_START_METHOD", "spawn")
+
+
+class LimitExceeded(Exception):
+    pass
+
+
+def _is_tar(source):
+    try:
+        return tarfile.is_tarfile(source)
+    except (OSError, tarfile.TarError, EOFError):
+        return False
+
+
+def is_archive(source):
+    """Whether a path or bytes hold a zip or (compressed) tar archive."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source[:4]) == b"PK\x03\x04" or _is_tar(io.BytesIO(source))
+    return zipfile.is_zipfile(source) or _is_tar(source)
+
+
+# -- archive members ----------------------------------------------------------
+
+class _Budget:
+    def __init__(self):
+        self.members = 0
+        self.bytes = 0
+
+    def take(self, size):
+        self.members += 1
+        self.bytes += size
+        if self.members > MAX_MEMBERS:
+            raise LimitExceeded(f"more than {MAX_MEMBERS} files")
+        if self.bytes > MAX_TOTAL_SIZE:
+            raise LimitExceeded(f"more than {MAX_TOTAL_SIZE} bytes in total")
+
+
+def _read(stream, name):
+    data = stream.read(MAX_MEMBER_SIZE + 1)
+    if len(data) > MAX_MEMBER_SIZE:
+        raise LimitExceeded(f"{name} is larger than {MAX_MEMBER_SIZE} bytes")
+    return data
+
+
+def _zip_member(archive, info):
+    try:
+        with archive.open(info) as stream:
+            return _read(stream, info.filename)
+    except RuntimeError:
+        # Encrypted; samples are usually shared with a well-known password
+        for password in ARCHIVE_PASSWORDS:
+            try:
+                with archive.open(info, pwd=password) as stream:
+                    return _read(stream, info.filename)
+            except RuntimeError:
+                continue
+        raise ValueError("encrypted with an unknown password")
+
+
+def _zip_members(source, prefix):
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            name = f"{prefix}{info.filename}"
+            if info.file_size > MAX_MEMBER_SIZE:
+                yield name, None, f"larger than {MAX_MEMBER_SIZE} bytes"
+                continue
+            try:
+                yield name, _zip_member(archive, info), None
+            except (ValueError, NotImplementedError, zipfile.BadZipFile, LimitExceeded) as e:
+                # NotImplementedError: AES encryption or an unsupported compression method
+                yield name, None, str(e)
+
+
+def _tar_members(source, prefix):
+    # Stream mode: members are read in order, never seeking back
+    kwargs = {"fileobj": source} if not isinstance(source, str) else {"name": source}
+    with tarfile.open(mode="r|*", **kwargs) as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            name = f"{prefix}{info.name}"
+            if info.size > MAX_MEMBER_SIZE:
+                yield name, None, f"larger than {MAX_MEMBER_SIZE} bytes"
+                continue
+            yield name, _read(archive.extractfile(info), name), None
+
+
+def members(source, name, budget=None, depth=0):
+    """
+    Yield (name, data, error) for every file in an upload.
+
+    Args:
+        source (str or bytes): Path of the upload, or a member's bytes.
+        name (str): Display name; archive members become "outer.zip/inner.exe".
+    """
+    budget = budget or _Budget()
+    if isinstance(source, str):
+        if not is_archive(source):
+            with open(source, "rb") as f:
+                data = _read(f, name)
+            budget.take(len(data))
+            yield name, data, None
+            return
+        stream = source
+    else:
+        stream = io.BytesIO(source)
+
+    opener = _zip_members if zipfile.is_zipfile(stream) else _tar_members
+    if not isinstance(stream, str):
+        stream.seek(0)
+    try:
+        for member, data, error in opener(stream, f"{name}/"):
+            if data is None:
+                yield member, None, error
+                continue
+            budget.take(len(data))
+            # Archives inside archives are opened in memory too
+            if depth + 1 < MAX_DEPTH and is_archive(data):
+                yield from members(data, member, budget, depth + 1)
+            else:
+                yield member, data, None
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        yield name, None, f"unreadable archive: {str(e)}"
+
+
+# -- worker side --------------------------------------------------------------
+
+_rules = None
+
+
+def _yara_rules():
+    """Compile the YARA rules once per worker process; None if unavailable."""
+    global _rules
+    if _rules is None:
+        _rules = False
+        if YARA_RULES_PATH and os.path.exists(YARA_RULES_PATH):
+            try:
+                import yara
+
+                if os.path.isdir(YARA_RULES_PATH):
+                    _rules = yara.compile(filepaths={
+                        entry: os.path.join(YARA_RULES_PATH, entry)
+                        for entry in sorted(os.listdir(YARA_RULES_PATH))
+                        if entry.endswith((".yar", ".yara"))
+                    })
+                else:
+                    _rules = yara.compile(filepath=YARA_RULES_PATH)
+            except Exception as e:
+                print(f"Error loading YARA rules: {str(e)}", file=sys.stderr)
+    return _rules or None
+
+
+def _yara(data):
+    rules = _yara_rules()
+    if rules is None:
+        return None
+    try:
+        return [
+            {"rule": match.rule, "namespace": match.namespace, "tags": list(match.tags), "meta": match.meta}
+            for match in rules.match(data=data, timeout=YARA_TIMEOUT)
+        ]
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _capa(data):
+    from file.capa import available, capa
+
+    if not available():
+        return {"error": "capa is not installed"}
+    fd, path = tempfile.mkstemp(prefix="capa_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return capa(path)
+    finally:
+        os.unlink(path)
+
+
+def analyze_member(data, name, sha256, run_capa=False):
+    """Full analysis of one file; runs in a worker process."""
+    from file.pe import analyze_pe_bytes
+
+    started = time.perf_counter()
+    result = analyze_pe_bytes(data, name)
+    result["file_info"]["sha256"] = sha256
+    result["file_info"]["md5"] = hashlib.md5(data).hexdigest()
+
+    matches = _yara(data)
+    if matches is not None:
+        result["yara"] = matches
+        if isinstance(matches, list) and matches:
+            result["risk_level"] = "High"
+    if run_capa and "error" not in result["pe_info"]:
+        result["capa"] = _capa(data)
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+# -- driver -------------------------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        # A worker killed mid-task (e.g. out of memory) breaks the whole pool
+        if _executor is None or getattr(_executor, "_broken", False):
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context(START_METHOD)
+            )
+    return _executor
+
+
+class BatchAnalysis:
+    def __init__(self, uploads, run_capa=False):
+        """
+        Args:
+            uploads (list): (path, filename) pairs of uploaded files.
+            run_capa (bool): Also run capa on every PE file.
+        """
+        self.uploads = uploads
+        self.run_capa = run_capa
+        self.seen = {}
+        self.files = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.pe_files = 0
+        self.packed = 0
+        self.yara_matches = 0
+        self.risk_levels = {}
+        self.started = time.monotonic()
+
+    def _count(self, result):
+        if "error" in result["pe_info"]:
+            return
+        self.pe_files += 1
+        self.packed += bool(result["pe_info"].get("packed"))
+        self.yara_matches += bool(isinstance(result.get("yara"), list) and result["yara"])
+        self.risk_levels[result["risk_level"]] = self.risk_levels.get(result["risk_level"], 0) + 1
+
+    def _done(self, futures, block):
+        if not futures:
+            return
+        finished, _ = wait(futures, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in finished:
+            name = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                self.errors += 1
+                yield {"name": name, "error": f"analysis failed: {str(e)}"}
+                continue
+            self._count(result)
+            yield result
+
+    def run(self):
+        """
+        Returns:
+            generator: One dict per file (analysis, duplicate or error) as
+            each completes.
+        """
+        pool = executor()
+        futures = {}
+        budget = _Budget()
+        try:
+            try:
+                for path, filename in self.uploads:
+                    for name, data, error in members(path, filename, budget):
+                        self.files += 1
+                        if error is not None:
+                            self.errors += 1
+                            yield {"name": name, "error": error}
+                            continue
+                        sha256 = hashlib.sha256(data).hexdigest()
+                        if sha256 in self.seen:
+                            self.duplicates += 1
+                            yield {"name": name, "sha256": sha256, "duplicate_of": self.seen[sha256]}
+                            continue
+                        self.seen[sha256] = name
+                        # Bound the member bytes held in memory while workers are busy
+                        while len(futures) >= WORKERS * 2:
+                            yield from self._done(futures, block=True)
+                        try:
+                            future = pool.submit(analyze_member, data, name, sha256, self.run_capa)
+                        except BrokenProcessPool:
+                            # A worker died; executor() replaces the pool
+                            pool = executor()
+                            future = pool.submit(analyze_member, data, name, sha256, self.run_capa)
+                        futures[future] = name
+                        yield from self._done(futures, block=False)
+            except LimitExceeded as e:
+                self.errors += 1
+                yield {"error": f"Upload limit reached: {str(e)}"}
+            except BrokenProcessPool as e:
+                self.errors += 1
+                yield {"error": f"Analysis workers failed: {str(e)}"}
+            while futures:
+                yield from self._done(futures, block=True)
+        finally:
+            # Only left over when the client went away mid-stream
+            for future in futures:
+                future.cancel()
+
+    def summary(self):
+        return {
+            "files": self.files,
+            "unique": len(self.seen),
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+            "pe_files": self.pe_files,
+            "packed": self.packed,
+            "yara_matches": self.yara_matches,
+            "risk_levels": self.risk_levels,
+            "elapsed": round(time.monotonic() - self.started, 3),
+        }
+
+
+def ndjson(analysis):
+    """Stream a batch analysis as JSON lines, ending with a {"summary": ...} line."""
+    for result in analysis.run():
+        yield json.dumps(result) + "\n"
+    yield json.dumps({"summary": analysis.summary()}) + "\n"
+
+
+def main():
+    parser = ArgumentParser(description="Analyze files and archives of binaries")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--capa", action="store_true", help="also run capa on PE files")
+    args = parser.parse_args()
+
+    analysis = BatchAnalysis([(path, os.path.basename(path)) for path in args.files], run_capa=args.capa)
+    for line in ndjson(analysis):
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,30 @@
 import json
 import os
+import subprocess
 
+CAPA_PATH = os.getenv("CAPA_PATH", "./capa/dist/capa")
+CAPA_TIMEOUT = float(os.getenv("CAPA_TIMEOUT", "300"))
 
-def capa(file):
-    os.system(f"./capa/dist/capa {file} -j > results.json")
 
-    results = {}
+def available():
+    return os.path.exists(CAPA_PATH)
+
 
+def capa(file):
+    # capa's JSON report is read from stdout so concurrent runs don't share a file
     try:
-        with open("results.json", "r", encoding="utf-8") as file:
-            results = json.load(file)
+        output = subprocess.run(
+            [CAPA_PATH, file, "-j"], capture_output=True, timeout=CAPA_TIMEOUT, check=False
+        ).stdout
+        return summarize(json.loads(output))
+    except subprocess.TimeoutExpired:
+        return {"error": "capa timed out"}
+    except Exception:
+        return {"error": "unsupported file format"}
+
 
+def summarize(results):
+    try:
         mitre = []
 
         for rule in results["rules"]:
@@ -0,0 +1,29 @@
+import os
+
+# One pooled client per worker process, shared by every async provider.
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "1000"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "200"))
+TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+_client = None
+
+
+def get_async_client():
+    global _client
+    if _client is None or _client.is_closed:
+        # Imported here so sync-only workers never pay for httpx
+        import httpx
+
+        _client = httpx.AsyncClient(
+            timeout=TIMEOUT,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_async_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -1,36 +1,34 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
-import requests
-import socket
 import re
-from attack.ipapi import ipapi
-from attack.talos import talos
-from attack.threatfox import threatfox
-from attack.tor import tor
-from attack.tranco import tranco
-from osint.internetdb import internetdb
-from osint.xposedornot import checkEmail
-from osint.phone import validate_phone_number
-from osint.username import sagemode_wrapper
+from providers import registry
+import scanner
+import telemetry
+from store.history import history
+from providers.governance import governor, ProviderUnavailable
+from risk.scoring import calculate_risk_score
+from validators import IP_REGEX, URL_REGEX, EMAIL_REGEX, PHONE_REGEX
 import tempfile
 import os
-import pefile
-import yara
 from dotenv import load_dotenv
-import time
-import networkx as nx
+
+# Providers, pefile and networkx are imported on first use (see
+# providers/registry.py) so the app boots without network access.
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": ["http://localhost:5173", "https://recongraphy.vercel.app"], "supports_credentials": True, "allow_headers": "*", "methods": ["GET", "POST", "OPTIONS"]}})
 
-IP_REGEX = r'^((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
-URL_REGEX = r'^([a-zA-Z0-9-]+\.)*[a-zA-Z0-9-]+\.[a-zA-Z]{2,}$'
 
-EMAIL_REGEX = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-PHONE_REGEX = r'^\+?[0-9]\d{1,14}$' 
+@app.before_request
+def start_trace():
+    g.trace = telemetry.start_request()
 
+@app.after_request
+def finish_trace(response):
+    telemetry.finish_request(request.endpoint, response.status_code, g.get("trace"))
+    return response
 
 # ipapi -> ipinfo
 # talos -> blacklisted ip
@@ -39,50 +37,6 @@ PHONE_REGEX = r'^\+?[0-9]\d{1,14}$'
 def home():
     return "Welcome to the ReconGraph"
 
-def safe_get(d, key, default):
-    if d is None:
-        return default
-    return d.get(key, default)
-
-def calculate_risk_score(results):
-    score = 0
-    details = []
-    # Open ports (each open port adds risk)
-    ports = safe_get(results.get('internetdb', {}), 'ports', [])
-    if ports:
-        score += min(len(ports) * 5, 30)  # up to 30 points
-        details.append(f"Open ports: {len(ports)}")
-    # CVEs (each CVE adds risk)
-    cves = safe_get(results.get('internetdb', {}), 'cves', [])
-    if cves:
-        score += min(len(cves) * 10, 30)  # up to 30 points
-        details.append(f"CVEs: {len(cves)}")
-    # Blacklist (high risk)
-    if safe_get(results.get('talos', {}), 'blacklisted', False):
-        score += 25
-        details.append("Blacklisted by Talos")
-    # Malware (high risk)
-    if safe_get(results.get('threatfox', {}), 'malware', None):
-        score += 25
-        details.append("Malware detected by ThreatFox")
-    # Tags (certain tags add risk)
-    tags = safe_get(results.get('internetdb', {}), 'tags', [])
-    risky_tags = {'honeypot', 'malware', 'botnet', 'spam', 'proxy'}
-    tag_risk = len(set(tags) & risky_tags) * 5
-    score += tag_risk
-    if tag_risk:
-        details.append(f"Risky tags: {', '.join(set(tags) & risky_tags)}")
-    # Clamp score to 0-100
-    score = min(score, 100)
-    # Risk level
-    if score >= 70:
-        level = 'High'
-    elif score >= 40:
-        level = 'Medium'
-    else:
-        level = 'Low'
-    return {"score": score, "level": level, "details": details}
-
 @app.route('/scan', methods=['POST'])
 def scan():
     try:
@@ -97,41 +51,24 @@ def scan():
 
         if re.match(IP_REGEX, ip_or_domain):
             input_type = 'ip'
-            ip_to_scan = ip_or_domain
-            url_to_scan = None
+            results = scanner.scan_ip(ip_or_domain)
         elif re.match(URL_REGEX, ip_or_domain):
             input_type = 'domain'
             try:
-                ip_to_scan = socket.gethostbyname(ip_or_domain)  # Resolve domain to IP
-                url_to_scan = ip_or_domain  # Keep the URL as it is
-            except socket.gaierror:
+                # Every A/AAAA address is enriched and merged into the result
+                results = scanner.scan_domain(ip_or_domain)
+            except scanner.ResolutionError:
                 return jsonify({"error": f"Unable to resolve domain: {ip_or_domain}"}), 400
         else:
             return jsonify({"error": "Invalid IP or domain format"}), 400
 
-        results = {}
-
-        if ip_to_scan:
-            try:
-                results["ipapi"] = ipapi(ip_to_scan)
-                results["talos"] = talos(ip_to_scan)
-                results["tor"] = tor(ip_to_scan)
-                results["internetdb"] = internetdb(ip_to_scan)
-            except Exception as e:
-                print(f"Error during IP scanning: {str(e)}")
-                results["error"] = f"Error during IP scanning: {str(e)}"
-
-        if url_to_scan:
-            try:
-                results["tranco"] = tranco(url_to_scan)
-                results["threatfox"] = threatfox(url_to_scan)
-            except Exception as e:
-                print(f"Error during URL scanning: {str(e)}")
-                results["error"] = f"Error during URL scanning: {str(e)}"
-
         # Add risk score
         results["risk"] = calculate_risk_score(results)
 
+        history.record(ip_or_domain, input_type, "scan", results)
+
+        if telemetry.wants_timings(request.args, body):
+            return jsonify({**results, "timings": g.trace.summary()})
         return jsonify(results)
 
     except Exception as e:
@@ -153,21 +90,118 @@ def footprint():
         input_type = 'phone'
         phone_to_scan = query
     else:
+        input_type = 'username'
         username_to_scan = query
 
     results = {}
 
-    if 'email_to_scan' in locals():
-        results["email_scan"] = checkEmail(email_to_scan)  # Replace with your email scan function
+    try:
+        if 'email_to_scan' in locals():
+            results["email_scan"] = registry.call("xposedornot", email_to_scan)  # Replace with your email scan function
 
-    if 'phone_to_scan' in locals():
-        results["phone_scan"] = validate_phone_number(phone_to_scan)  # Replace with your phone scan function
+        if 'phone_to_scan' in locals():
+            results["phone_scan"] = registry.call("numverify", phone_to_scan)  # Replace with your phone scan function
+    except ProviderUnavailable as e:
+        return jsonify({"error": str(e)}), 503
 
     if 'username_to_scan' in locals():
-        results["username_scan"] = sagemode_wrapper(username_to_scan)  # Replace with your username scan function
+        results["username_scan"] = registry.call("sagemode", username_to_scan)  # Replace with your username scan function
 
+    history.record(query, input_type, "footprint", results)
+
+    if telemetry.wants_timings(request.args, body):
+        return jsonify({**results, "timings": g.trace.summary()})
     return jsonify(results)
 
+@app.route('/footprint/usernames', methods=['POST'])
+def footprint_usernames():
+    from osint.username import BatchSearch, expand_usernames, ndjson
+
+    body = request.get_json(silent=True) or {}
+    usernames = body.get('usernames')
+    if not isinstance(usernames, list) or not usernames:
+        return jsonify({"error": "No usernames provided."}), 400
+
+    try:
+        usernames = expand_usernames(usernames, with_variants=bool(body.get('variants')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Found profiles stream back as NDJSON while the remaining probes run
+    search = BatchSearch(usernames, found_only=body.get('found_only', True) is not False)
+    return Response(ndjson(search), mimetype="application/x-ndjson")
+
+@app.route('/footprint/emails', methods=['POST'])
+def footprint_emails():
+    from osint.xposedornot import MAX_BATCH, checkEmails
+
+    body = request.get_json(silent=True) or {}
+    emails = body.get('emails')
+    if not isinstance(emails, list) or not emails:
+        return jsonify({"error": "No emails provided."}), 400
+    invalid = [email for email in emails if not isinstance(email, str) or not re.match(EMAIL_REGEX, email)]
+    if invalid:
+        return jsonify({"error": "Invalid email addresses", "invalid": invalid[:20]}), 400
+    if len(emails) > MAX_BATCH:
+        return jsonify({"error": f"Too many emails ({len(emails)}), the limit is {MAX_BATCH}"}), 400
+
+    # Breach details come back once per breach, not once per email
+    return jsonify(checkEmails(emails, analytics=bool(body.get('analytics'))))
+
+@app.route('/footprint/phones', methods=['POST'])
+def footprint_phones():
+    from osint.phone import MAX_BATCH, validate_phone_numbers
+
+    body = request.get_json(silent=True) or {}
+    numbers = body.get('numbers')
+    if not isinstance(numbers, list) or not numbers or not all(isinstance(number, str) for number in numbers):
+        return jsonify({"error": "No phone numbers provided."}), 400
+    if len(numbers) > MAX_BATCH:
+        return jsonify({"error": f"Too many phone numbers ({len(numbers)}), the limit is {MAX_BATCH}"}), 400
+
+    # Invalid and cached numbers are answered offline; NumVerify only sees the rest
+    return jsonify(validate_phone_numbers(numbers, body.get('country_code')))
+
+@app.route('/providers', methods=['GET'])
+def providers_list():
+    return jsonify([provider.describe() for provider in registry.PROVIDERS.values()])
+
+@app.route('/providers/status', methods=['GET'])
+def providers_status():
+    return jsonify(governor.status())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(telemetry.metrics.render(), content_type=telemetry.CONTENT_TYPE)
+
+@app.route('/history', methods=['GET'])
+def scan_history():
+    args = request.args
+    try:
+        rows = history.query(
+            ioc=args.get('ioc'),
+            since=args.get('since', type=float),
+            until=args.get('until', type=float),
+            asn=args.get('asn'),
+            country=args.get('country'),
+            cve=args.get('cve'),
+            risk_level=args.get('risk_level'),
+            kind=args.get('kind'),
+            limit=min(args.get('limit', 100, type=int), 1000),
+            include_result=args.get('full', 'true').lower() != 'false',
+        )
+    except Exception as e:
+        print(f"Error querying scan history: {str(e)}")
+        return jsonify({"error": f"Error querying scan history: {str(e)}"}), 500
+    return jsonify({"count": len(rows), "results": rows})
+
+@app.route('/history/diff', methods=['GET'])
+def scan_history_diff():
+    ioc = request.args.get('ioc')
+    if not ioc:
+        return jsonify({"error": "No ioc provided"}), 400
+    return jsonify(history.diff(ioc))
+
 
 @app.route("/capa_analyze", methods=["POST", "OPTIONS"])
 def upload_file():
@@ -177,68 +211,45 @@ def upload_file():
     if "file" not in request.files:
         return jsonify({"error": "No file part"}), 400
 
-    file = request.files["file"]
-    if file.filename == "":
+    uploads = [file for file in request.files.getlist("file") if file.filename != ""]
+    if not uploads:
         return jsonify({"error": "No selected file"}), 400
 
-    temp_file_path = None
+    # Several files, an archive, or ?multi=true stream back one result per file
+    from file.batch import MAX_MEMBER_SIZE, BatchAnalysis, is_archive, ndjson
+
+    temp_file_paths = []
     try:
-        # Create a temporary file with a unique name
-        temp_file_path = os.path.join(tempfile.gettempdir(), f"analysis_{os.urandom(8).hex()}")
-        
-        # Save the uploaded file directly to the temp path
-        file.save(temp_file_path)
-
-        # Initialize analysis results
-        analysis_result = {
-            "file_info": {
-                "name": file.filename,
-                "size": os.path.getsize(temp_file_path)
-            },
-            "pe_info": {},
-            "risk_level": "Low",
-            "categories": {
-                "Defense Evasion": [],
-                "Execution": [],
-                "Discovery": [],
-                "Persistence": []
-            }
-        }
-
-        # Try to analyze as PE file
-        try:
-            pe = pefile.PE(temp_file_path)
-            
-            # Get PE information
-            analysis_result["pe_info"] = {
-                "machine_type": hex(pe.FILE_HEADER.Machine),
-                "timestamp": pe.FILE_HEADER.TimeDateStamp,
-                "sections": [section.Name.decode().rstrip('\x00') for section in pe.sections],
-                "imports": []
-            }
-
-            # Get imports
-            if hasattr(pe, 'DIRECTORY_ENTRY_IMPORT'):
-                for entry in pe.DIRECTORY_ENTRY_IMPORT:
-                    dll_name = entry.dll.decode()
-                    imports = [imp.name.decode() for imp in entry.imports if imp.name]
-                    analysis_result["pe_info"]["imports"].append({
-                        "dll": dll_name,
-                        "functions": imports
-                    })
-
-                    # Categorize imports
-                    if any(x in dll_name.lower() for x in ['kernel32', 'ntdll']):
-                        analysis_result["categories"]["Execution"].extend(imports)
-                    if any(x in dll_name.lower() for x in ['advapi32', 'user32']):
-                        analysis_result["categories"]["Persistence"].extend(imports)
-                    if any(x in dll_name.lower() for x in ['ws2_32', 'wininet']):
-                        analysis_result["categories"]["Discovery"].extend(imports)
-
-        except pefile.PEFormatError:
-            analysis_result["pe_info"]["error"] = "Not a valid PE file"
-        except Exception as e:
-            analysis_result["pe_info"]["error"] = str(e)
+        for file in uploads:
+            # Create a temporary file with a unique name
+            temp_file_path = os.path.join(tempfile.gettempdir(), f"analysis_{os.urandom(8).hex()}")
+            temp_file_paths.append(temp_file_path)
+            # Save the uploaded file directly to the temp path
+            file.save(temp_file_path)
+
+        multi = request.args.get('multi', 'false').lower() in ('1', 'true')
+        if multi or len(uploads) > 1 or is_archive(temp_file_paths[0]):
+            analysis = BatchAnalysis(
+                list(zip(temp_file_paths, [file.filename for file in uploads])),
+                run_capa=request.args.get('capa', 'false').lower() in ('1', 'true'),
+            )
+            paths, temp_file_paths = temp_file_paths, []
+
+            def generate():
+                try:
+                    yield from ndjson(analysis)
+                finally:
+                    for path in paths:
+                        os.unlink(path)
+
+            return Response(generate(), mimetype="application/x-ndjson")
+
+        if os.path.getsize(temp_file_paths[0]) > MAX_MEMBER_SIZE:
+            return jsonify({"error": f"File is larger than {MAX_MEMBER_SIZE} bytes"}), 413
+
+        from file.pe import analyze_pe
+
+        analysis_result = analyze_pe(temp_file_paths[0], uploads[0].filename)
 
         return jsonify(analysis_result)
 
@@ -246,17 +257,45 @@ def upload_file():
         print(f"Error during analysis: {str(e)}")
         return jsonify({"error": str(e)}), 500
     finally:
-        # Clean up temp file in finally block to ensure it happens
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                # Add a small delay to ensure all file handles are released
-                time.sleep(0.1)
-                os.unlink(temp_file_path)
-            except Exception as e:
-                print(f"Error cleaning up temp file: {str(e)}")
+        # Clean up temp files in finally block to ensure it happens
+        for temp_file_path in temp_file_paths:
+            if os.path.exists(temp_file_path):
+                try:
+                    os.unlink(temp_file_path)
+                except Exception as e:
+                    print(f"Error cleaning up temp file: {str(e)}")
+
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    if "file" not in request.files:
+        return jsonify({"error": "No file part"}), 400
+
+    file = request.files["file"]
+    if file.filename == "":
+        return jsonify({"error": "No selected file"}), 400
+
+    from pipeline.ingest import Pipeline, ndjson, open_upload
+
+    # The upload is closed when the request ends, before the response has
+    # streamed, so it is copied to a temp file first.
+    temp_file_path = os.path.join(tempfile.gettempdir(), f"ingest_{os.urandom(8).hex()}")
+    file.save(temp_file_path)
+    # Only local feeds unless ?remote=true; results stream back as NDJSON
+    pipeline = Pipeline(remote=request.args.get('remote', 'false').lower() in ('1', 'true'))
+
+    def generate():
+        try:
+            with open(temp_file_path, "rb") as f:
+                yield from ndjson(pipeline, open_upload(f, file.filename))
+        finally:
+            os.unlink(temp_file_path)
+
+    return Response(generate(), mimetype="application/x-ndjson")
 
 @app.route('/pagerank', methods=['POST'])
 def pagerank():
+    import networkx as nx
+
     data = request.get_json()
     nodes = data.get('nodes', [])
     edges = data.get('edges', [])
@@ -294,4 +333,4 @@ def pagerank():
 #         return jsonify({'error': str(e)}), 500
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    app.run(host="0.0.0.0", port=8000, debug=os.getenv("FLASK_DEBUG", "false").lower() in ("1", "true"))
@@ -0,0 +1,348 @@
+"""
+Offline CVE index.
+
+NVD JSON feeds (2.0 API dumps or legacy 1.1 yearly feeds), FIRST EPSS
+scores and the CISA KEV catalog are imported into one sorted NumPy
+structured array keyed by CVE number (plus a contiguous copy of the
+keys), saved as .npy files and memory-mapped. Bulk lookups are a single
+vectorised binary search.
+
+    python -m osint.cve nvd nvdcve-2.0-2024.json.gz [more feeds...]
+    python -m osint.cve epss epss_scores-current.csv.gz
+    python -m osint.cve kev known_exploited_vulnerabilities.json
+    python -m osint.cve lookup CVE-2021-44228
+"""
+import csv
+import datetime
+import functools
+import gzip
+import io
+import json
+import os
+import re
+import threading
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+index_location = os.getenv("CVE_INDEX_PATH", "media/cve")
+RELOAD_INTERVAL = 60.0
+
+CVE_REGEX = re.compile(r"^CVE-(\d{4})-(\d{4,})$", re.IGNORECASE)
+
+DTYPE = np.dtype([
+    ("key", np.uint64),
+    ("cvss", np.float32),
+    ("epss", np.float32),
+    ("kev", np.uint8),
+    # days since 1970-01-01, -1 when unknown
+    ("published", np.int32),
+])
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def cve_key(cve_id: str):
+    match = CVE_REGEX.match(cve_id.strip())
+    if not match:
+        return None
+    return (int(match.group(1)) << 32) | int(match.group(2))
+
+
+def key_to_id(key: int) -> str:
+    return f"CVE-{key >> 32}-{key & 0xFFFFFFFF:04d}"
+
+
+def severity(cvss) -> str:
+    # NaN marks a CVE without a CVSS score
+    if cvss is None or cvss != cvss:
+        return "unknown"
+    if cvss >= 9.0:
+        return "critical"
+    if cvss >= 7.0:
+        return "high"
+    if cvss >= 4.0:
+        return "medium"
+    if cvss > 0:
+        return "low"
+    return "none"
+
+
+def _open(path, mode="r"):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _paths(prefix):
+    return f"{prefix}.keys.npy", f"{prefix}.npy", f"{prefix}.meta.json"
+
+
+def _days(timestamp):
+    if not timestamp:
+        return -1
+    try:
+        return (datetime.date.fromisoformat(timestamp[:10]) - EPOCH).days
+    except ValueError:
+        return -1
+
+
+@functools.lru_cache(maxsize=16384)
+def _date(days):
+    return (EPOCH + datetime.timedelta(days=days)).isoformat() if days >= 0 else None
+
+
+def _nvd_records(feed):
+    """Yield (cve_id, cvss, published) from an NVD 2.0 or 1.1 JSON feed."""
+    if "vulnerabilities" in feed:
+        for item in feed["vulnerabilities"]:
+            cve = item.get("cve", {})
+            metrics = cve.get("metrics", {})
+            cvss = None
+            for name in ("cvssMetricV40", "cvssMetricV31", "cvssMetricV30", "cvssMetricV2"):
+                if metrics.get(name):
+                    cvss = metrics[name][0].get("cvssData", {}).get("baseScore")
+                    break
+            yield cve.get("id", ""), cvss, cve.get("published")
+    for item in feed.get("CVE_Items", []):
+        impact = item.get("impact", {})
+        cvss = (
+            impact.get("baseMetricV3", {}).get("cvssV3", {}).get("baseScore")
+            or impact.get("baseMetricV2", {}).get("cvssV2", {}).get("baseScore")
+        )
+        yield item.get("cve", {}).get("CVE_data_meta", {}).get("ID", ""), cvss, item.get("publishedDate")
+
+
+class CVEIndex:
+    def __init__(self, prefix=None):
+        self.prefix = prefix or index_location
+        self.keys = None
+        self.table = None
+        self.meta = None
+        self._loaded_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # -- loading --------------------------------------------------------
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            keys_path, table_path, meta_path = _paths(self.prefix)
+            try:
+                mtime = os.path.getmtime(meta_path)
+            except OSError:
+                return
+            if mtime == self._loaded_mtime:
+                return
+            try:
+                keys = np.load(keys_path, mmap_mode="r")
+                table = np.load(table_path, mmap_mode="r")
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except Exception as e:
+                print(f"Error loading CVE index: {str(e)}")
+                return
+            if len(keys) != len(table):
+                return
+            self.keys, self.table, self.meta = keys, table, meta
+            self._loaded_mtime = mtime
+
+    @property
+    def available(self):
+        self._maybe_reload()
+        return self.table is not None
+
+    # -- lookups --------------------------------------------------------
+
+    def lookup_many(self, cve_ids):
+        """
+        Look up many CVE IDs at once.
+
+        Returns:
+            list: One dict per input ID (None for unknown/unparseable IDs).
+        """
+        self._maybe_reload()
+        keys = [cve_key(cve_id) for cve_id in cve_ids]
+        if self.table is None or not len(self.table):
+            return [None] * len(keys)
+
+        valid = np.array([key is not None for key in keys], dtype=bool)
+        wanted = np.array([key or 0 for key in keys], dtype=np.uint64)
+        positions = np.searchsorted(self.keys, wanted)
+        positions = np.minimum(positions, len(self.table) - 1)
+        rows = self.table[positions]
+        found = valid & (rows["key"] == wanted)
+
+        # Column-wise .tolist() avoids per-row NumPy scalar overhead
+        results = []
+        columns = zip(keys, found.tolist(), rows["cvss"].tolist(), rows["epss"].tolist(),
+                      rows["kev"].tolist(), rows["published"].tolist())
+        for key, hit, cvss, epss, kev, published in columns:
+            if not hit:
+                results.append(None)
+                continue
+            results.append({
+                # Canonical form, whatever spacing or case the caller used
+                "id": key_to_id(key),
+                "cvss": None if cvss != cvss else round(cvss, 1),
+                "severity": severity(cvss),
+                "epss": None if epss != epss else round(epss, 5),
+                "kev": bool(kev),
+                "published": _date(published),
+            })
+        return results
+
+    def lookup(self, cve_id):
+        return self.lookup_many([cve_id])[0]
+
+    # -- imports --------------------------------------------------------
+
+    def _load_for_update(self):
+        _, table_path, _ = _paths(self.prefix)
+        if os.path.isfile(table_path):
+            return np.load(table_path).copy()
+        return np.zeros(0, dtype=DTYPE)
+
+    def _save(self, table, source):
+        table = np.sort(table, order="key")
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        keys_path, table_path, meta_path = _paths(self.prefix)
+        # Keys are also saved as their own contiguous array: searchsorted
+        # on a strided field of the record array would copy it every call.
+        for path, array in ((keys_path, np.ascontiguousarray(table["key"])), (table_path, table)):
+            with open(f"{path}.tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(f"{path}.tmp", path)
+        # Meta goes last: readers reload when this file changes
+        meta = {"updated_at": time.time(), "entries": int(len(table)), "last_import": source}
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        self._checked_at = 0.0
+        return meta
+
+    @staticmethod
+    def _upsert(table, keys, field, values):
+        """Set `field` for `keys`, appending rows for keys not yet present."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        values = np.asarray(values)
+        order = np.argsort(keys, kind="stable")
+        keys, values = keys[order], values[order]
+        # Last write wins for duplicate keys within one import
+        last = np.r_[keys[1:] != keys[:-1], True] if len(keys) else np.zeros(0, dtype=bool)
+        keys, values = keys[last], values[last]
+
+        positions = np.searchsorted(table["key"], keys)
+        clipped = np.minimum(positions, max(len(table) - 1, 0))
+        present = (positions < len(table)) & (table["key"][clipped] == keys) if len(table) else np.zeros(len(keys), bool)
+
+        table[field][clipped[present]] = values[present]
+        missing = ~present
+        if missing.any():
+            extra = np.zeros(int(missing.sum()), dtype=DTYPE)
+            extra["key"] = keys[missing]
+            extra["cvss"] = np.nan
+            extra["epss"] = np.nan
+            extra["published"] = -1
+            extra[field] = values[missing]
+            table = np.concatenate([table, extra])
+            table.sort(order="key")
+        return table
+
+    def import_nvd(self, paths):
+        table = self._load_for_update()
+        keys, cvss, published = [], [], []
+        for path in paths:
+            with _open(path) as f:
+                feed = json.load(f)
+            for cve_id, score, date in _nvd_records(feed):
+                key = cve_key(cve_id)
+                if key is None:
+                    continue
+                keys.append(key)
+                cvss.append(np.nan if score is None else float(score))
+                published.append(_days(date))
+        table = self._upsert(table, keys, "cvss", np.array(cvss, dtype=np.float32))
+        table = self._upsert(table, keys, "published", np.array(published, dtype=np.int32))
+        return self._save(table, f"nvd: {len(keys)} records")
+
+    def import_epss(self, path):
+        table = self._load_for_update()
+        keys, scores = [], []
+        with _open(path) as f:
+            for row in csv.reader(line for line in f if not line.startswith("#")):
+                if len(row) < 2:
+                    continue
+                key = cve_key(row[0])
+                if key is None:
+                    continue
+                try:
+                    scores.append(float(row[1]))
+                except ValueError:
+                    continue
+                keys.append(key)
+        table = self._upsert(table, keys, "epss", np.array(scores, dtype=np.float32))
+        return self._save(table, f"epss: {len(keys)} records")
+
+    def import_kev(self, path):
+        table = self._load_for_update()
+        with _open(path) as f:
+            catalog = json.load(f)
+        keys = [key for key in (cve_key(item.get("cveID", "")) for item in catalog.get("vulnerabilities", [])) if key]
+        # The catalog is complete: clear flags that were withdrawn
+        table["kev"] = 0
+        table = self._upsert(table, keys, "kev", np.ones(len(keys), dtype=np.uint8))
+        return self._save(table, f"kev: {len(keys)} records")
+
+
+cve_index = CVEIndex()
+
+
+def enrich(cve_ids):
+    """
+    Enrich a scan's CVE list. Unknown CVEs keep their ID with
+    severity "unknown" so they still count in risk scoring.
+    """
+    details = []
+    for cve_id, record in zip(cve_ids, cve_index.lookup_many(cve_ids)):
+        details.append(record or {
+            "id": cve_id.upper(), "cvss": None, "severity": "unknown", "epss": None, "kev": False, "published": None,
+        })
+    return details
+
+
+def main():
+    parser = ArgumentParser(description="Import or query the offline CVE index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    nvd = subparsers.add_parser("nvd")
+    nvd.add_argument("feeds", nargs="+", help="NVD JSON feed files, optionally gzipped")
+    epss = subparsers.add_parser("epss")
+    epss.add_argument("path")
+    kev = subparsers.add_parser("kev")
+    kev.add_argument("path")
+    lookup = subparsers.add_parser("lookup")
+    lookup.add_argument("cves", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "nvd":
+        print(cve_index.import_nvd(args.feeds))
+    elif args.command == "epss":
+        print(cve_index.import_epss(args.path))
+    elif args.command == "kev":
+        print(cve_index.import_kev(args.path))
+    else:
+        print(json.dumps(enrich(args.cves), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,35 @@
+import os
+
 import requests
 
+from http_client import TIMEOUT
+from osint.cve import enrich
+
+
+base_url = os.getenv("INTERNETDB_URL", "https://internetdb.shodan.io/")
+
 
 def internetdb(ip: str) -> dict:
-    url = f"https://internetdb.shodan.io/{ip}"
+    url = f"{base_url}{ip}"
+
+    response = requests.get(url, timeout=TIMEOUT)
+
+    return _parse(response)
 
-    results = requests.get(url).json()
+
+async def internetdb_async(ip: str, client) -> dict:
+    response = await client.get(f"{base_url}{ip}")
+
+    return _parse(response)
+
+
+def _parse(response) -> dict:
+    # InternetDB answers 404 for addresses it has no data on
+    if response.status_code == 404:
+        return {"hostnames": [], "ports": [], "tags": [], "cves": [], "cve_details": []}
+    response.raise_for_status()
+
+    results = response.json()
 
     hostnames = results["hostnames"]
 
@@ -16,6 +41,10 @@ def internetdb(ip: str) -> dict:
     for vuln in results["vulns"]:
         cves.append({vuln: f"https://nvd.nist.gov/vuln/detail/{vuln.lower()}"})
 
-    results = {"hostnames": hostnames, "ports": ports, "tags": tags, "cves": cves}
+    # Severity/EPSS/KEV from the offline CVE index; `cves` keeps its shape
+    # for the frontend.
+    cve_details = enrich(results["vulns"])
+
+    results = {"hostnames": hostnames, "ports": ports, "tags": tags, "cves": cves, "cve_details": cve_details}
 
     return results
@@ -0,0 +1,195 @@
+"""
+Offline phone number validation against the E.164 numbering plan.
+
+Country calling codes, national prefixes and shared-code regions from
+numbering_plan.json are compiled into one digit trie, so a number is
+checked by walking its digits once: the country code (E.164 codes are
+prefix-free), then the longest matching national prefix for the line type
+and region. Numbers whose national significant number has a length (or
+pattern) the country does not use are rejected without any API call.
+
+    python -m osint.numbering +14155550100 "+44 20 7946 0958" 0612345678 --country FR
+"""
+import json
+import os
+import re
+from argparse import ArgumentParser
+
+PLAN_PATH = os.getenv(
+    "PHONE_PLAN_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "numbering_plan.json")
+)
+
+PUNCTUATION = re.compile(r"[\s().\-/]")
+
+
+class _Node:
+    __slots__ = ("children", "country", "line_type", "region")
+
+    def __init__(self):
+        self.children = {}
+        # Set on the node ending a country calling code
+        self.country = None
+        # Set on nodes ending a national prefix
+        self.line_type = None
+        self.region = None
+
+
+class Country:
+    __slots__ = ("calling_code", "iso", "name", "lengths", "trunk", "pattern")
+
+    def __init__(self, calling_code, entry):
+        self.calling_code = calling_code
+        self.iso = entry["iso"]
+        self.name = entry["name"]
+        self.lengths = frozenset(entry["lengths"])
+        self.trunk = entry.get("trunk")
+        self.pattern = re.compile(entry["pattern"]) if entry.get("pattern") else None
+
+
+class NumberingPlan:
+    def __init__(self, plan):
+        self.root = _Node()
+        self.names = dict(plan.get("_names", {}))
+        # ISO code -> calling code, for numbers given in national format
+        self.by_iso = {}
+        for calling_code, entry in plan.items():
+            if calling_code.startswith("_"):
+                continue
+            country = Country(calling_code, entry)
+            self.names.setdefault(country.iso, country.name)
+            self.by_iso.setdefault(country.iso, calling_code)
+            self._insert(calling_code).country = country
+            for prefix, line_type in entry.get("types", {}).items():
+                self._insert(calling_code + prefix).line_type = line_type
+            for prefix, iso in entry.get("regions", {}).items():
+                self._insert(calling_code + prefix).region = iso
+                self.by_iso.setdefault(iso, calling_code)
+
+    @classmethod
+    def load(cls, path=PLAN_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _insert(self, digits):
+        node = self.root
+        for digit in digits:
+            node = node.children.setdefault(digit, _Node())
+        return node
+
+    def normalize(self, number, country_code=None):
+        """
+        Turn user input into international digits.
+
+        Numbers starting with "+" or "00" are international. Others are
+        national numbers of `country_code` (ISO, e.g. "GB") when given;
+        without it they are read as international, as NumVerify does.
+
+        Returns:
+            str: Digits including the country calling code, or None.
+        """
+        number = PUNCTUATION.sub("", str(number))
+        if number.startswith("+"):
+            digits = number[1:]
+        elif number.startswith("00"):
+            digits = number[2:]
+        elif country_code:
+            calling_code = self.by_iso.get(country_code.upper())
+            if calling_code is None:
+                return None
+            # A leading trunk prefix is dropped by parse() where needed
+            digits = calling_code + number
+        else:
+            digits = number
+        return digits if digits.isdigit() else None
+
+    def _walk(self, digits):
+        """Returns (country, index after the calling code, line type, region)."""
+        node = self.root
+        country, start, line_type, region = None, 0, None, None
+        for i, digit in enumerate(digits):
+            node = node.children.get(digit)
+            if node is None:
+                break
+            if country is None:
+                if node.country is not None:
+                    country, start = node.country, i + 1
+                    line_type = node.line_type
+                continue
+            if node.line_type is not None:
+                line_type = node.line_type
+            if node.region is not None:
+                region = node.region
+        return country, start, line_type, region
+
+    def parse(self, number, country_code=None):
+        """
+        Validate a phone number offline.
+
+        Args:
+            number (str): The phone number, international or national.
+            country_code (str): Optional ISO country code for national numbers.
+
+        Returns:
+            dict: "valid" plus, when valid, the NumVerify-style fields that
+            can be derived offline; "reason" when not.
+        """
+        digits = self.normalize(number, country_code)
+        if not digits:
+            return {"valid": False, "reason": "not a phone number"}
+        if len(digits) > 15:
+            return {"valid": False, "reason": "longer than 15 digits"}
+
+        country, start, line_type, region = self._walk(digits)
+        if country is None:
+            return {"valid": False, "reason": "unknown country calling code"}
+
+        national = digits[start:]
+        # "+44 (0)20 ..." style input repeats the trunk prefix
+        if country.trunk and len(national) not in country.lengths and national.startswith(country.trunk) \
+                and len(national) - len(country.trunk) in country.lengths:
+            national = national[len(country.trunk):]
+            digits = country.calling_code + national
+            _, _, line_type, region = self._walk(digits)
+        if len(national) not in country.lengths:
+            return {"valid": False, "reason": f"invalid length for {country.iso}"}
+        if country.pattern is not None and not country.pattern.fullmatch(national):
+            return {"valid": False, "reason": f"invalid number for {country.iso}"}
+
+        iso = region or country.iso
+        return {
+            "valid": True,
+            "number": digits,
+            "local_format": national,
+            "international_format": f"+{digits}",
+            "country_prefix": f"+{country.calling_code}",
+            "country_code": iso,
+            "country_name": self.names.get(iso, country.name),
+            "line_type": line_type,
+        }
+
+
+_plan = None
+
+
+def plan():
+    global _plan
+    if _plan is None:
+        _plan = NumberingPlan.load()
+    return _plan
+
+
+def parse(number, country_code=None):
+    return plan().parse(number, country_code)
+
+
+def main():
+    parser = ArgumentParser(description="Validate phone numbers against the offline numbering plan")
+    parser.add_argument("numbers", nargs="+")
+    parser.add_argument("--country", help="ISO country code for national numbers")
+    args = parser.parse_args()
+    for number in args.numbers:
+        print(json.dumps({"query": number, **parse(number, args.country)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,33 @@
+import asyncio
 import requests
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from http_client import TIMEOUT
+from osint import numbering
+from providers.governance import governor, ProviderUnavailable
+from providers.registry import cache
+
 # Load the .env file
 load_dotenv()
 
+# Define the API endpoint
+url = os.getenv("NUMVERIFY_URL", "http://apilayer.net/api/validate")
+
+# Ask NumVerify about numbers that pass the offline checks (carrier, location)
+API_LOOKUP = os.getenv("NUMVERIFY_LOOKUP", "true").lower() in ("1", "true")
+# NumVerify answers are cached per E.164 number, whatever format was queried
+CACHE_TTL = int(os.getenv("NUMVERIFY_CACHE_TTL", str(7 * 86400)))
+BATCH_WORKERS = int(os.getenv("PHONE_BATCH_WORKERS", "4"))
+MAX_BATCH = int(os.getenv("PHONE_MAX_BATCH", "1000"))
+
+
 def validate_phone_number(number, country_code=None):
     """
-    Validate a phone number using the NumVerify API.
-    
+    Validate a phone number, offline first and with the NumVerify API for
+    numbers that pass.
+
     Args:
         number (str): The phone number to validate.
         country_code (str): Optional country code for the phone number.
@@ -16,40 +35,173 @@ def validate_phone_number(number, country_code=None):
     Returns:
         dict: The API response in JSON format.
     """
+    local, cached = _precheck(number, country_code)
+    if cached is not None:
+        return cached
+
+    # Make the API request
+    try:
+        data = governor.call("numverify", local["number"], _api, local["number"])
+    except (requests.RequestException, ProviderUnavailable) as e:
+        # Handle request errors; the offline answer still stands
+        return _offline(local, str(e))
+    return _store(local, data)
+
+
+async def validate_phone_number_async(number, client, country_code=None):
+    """
+    Async variant of validate_phone_number() using a shared httpx client.
+    """
+    import httpx
+
+    local, cached = _precheck(number, country_code)
+    if cached is not None:
+        return cached
+
+    try:
+        data = await governor.acall("numverify", local["number"], lambda: _api_async(local["number"], client))
+    except (httpx.HTTPError, ProviderUnavailable) as e:
+        return _offline(local, str(e))
+    return _store(local, data)
+
+
+def _precheck(number, country_code=None):
+    """
+    Returns:
+        tuple: (offline result, final answer or None if NumVerify is needed).
+    """
+    local = numbering.parse(number, country_code)
+    if not local["valid"]:
+        return local, {"phone_no": False, "reason": local["reason"]}
+    if not API_LOOKUP or not os.getenv("NUMVERIFY_API_KEY"):
+        return local, _offline(local)
+    return local, cache.get(("numverify", local["number"]))
+
+
+def _offline(local, error=None):
+    result = {**local, "location": "", "carrier": "", "source": "offline"}
+    if error:
+        result["error"] = error
+    return result
+
+
+def _store(local, data):
+    result = _parse(data)
+    if result.get("phone_no") is not False:
+        # Fill what NumVerify leaves out (e.g. line type) from the numbering plan
+        result = {**local, **{key: value for key, value in result.items() if value not in (None, "")},
+                  "source": "numverify"}
+    if not data.get("stale"):
+        cache.set(("numverify", local["number"]), result, CACHE_TTL)
+    return result
+
+
+def _api(number):
+    response = requests.get(url, params=_params(number), timeout=TIMEOUT)
+    response.raise_for_status()  # Raise an exception for HTTP errors
+    return response.json()
+
+
+async def _api_async(number, client):
+    response = await client.get(url, params=_params(number))
+    response.raise_for_status()
+    return response.json()
+
+
+def _params(number, country_code=None):
     # Load the API key from the .env file
     api_key = os.getenv("NUMVERIFY_API_KEY")
     if not api_key:
         raise ValueError("API key not found. Please set NUMVERIFY_API_KEY in the .env file.")
 
-    # Define the API endpoint and parameters
-    url = "http://apilayer.net/api/validate"
-    params = {
+    return {
         "access_key": api_key,
         "number": number,
         "country_code": country_code or "",
         "format": 1
     }
 
-    # Make the API request
-    try:
-        # Make the API request
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-
-        # Parse the JSON response
-        data = response.json()
-        
-        # Check if the number is valid
-        if not data.get("valid", False):
-            return {"phone_no": False}
-        
-        return data
-    except requests.RequestException as e:
-        # Handle request errors
-        return {"phone_no": False, "error": str(e)}
 
-# Example usage
+def _parse(data):
+    # Check if the number is valid
+    if not data.get("valid", False):
+        return {"phone_no": False}
+
+    return data
+
+
+def _batch_stats(numbers, results, unique):
+    return {
+        "numbers": len(numbers),
+        "invalid": sum(1 for result in results if "reason" in result),
+        "api_calls": len(unique),
+    }
+
+
+def _plan_batch(numbers, country_code=None):
+    """
+    Split a batch into answers known without the API and the distinct
+    numbers that still need a NumVerify call.
+    """
+    answers, pending = {}, {}
+    for number in numbers:
+        if number in answers or number in pending:
+            continue
+        local, cached = _precheck(number, country_code)
+        if cached is not None:
+            answers[number] = cached
+        else:
+            pending[number] = local
+    # Different spellings of the same number share one call
+    unique = {local["number"]: local["international_format"] for local in pending.values()}
+    return answers, pending, unique
+
+
+def validate_phone_numbers(numbers, country_code=None, workers=BATCH_WORKERS):
+    """
+    Validate a list of phone numbers. Invalid and cached numbers are
+    answered offline; the rest go to NumVerify once per distinct number,
+    a few at a time.
 
-# Replace with a phone number to test
-result = validate_phone_number("141585862")
-print(result)
\ No newline at end of file
+    Args:
+        numbers (list): Phone numbers in any supported format.
+        country_code (str): Optional ISO country code for national numbers.
+
+    Returns:
+        dict: "results" in input order and "stats".
+    """
+    answers, pending, unique = _plan_batch(numbers, country_code)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        looked_up = dict(zip(unique, pool.map(validate_phone_number, unique.values())))
+    for number, local in pending.items():
+        answers[number] = looked_up[local["number"]]
+
+    results = [answers[number] for number in numbers]
+    return {"results": [{"query": number, **result} for number, result in zip(numbers, results)],
+            "stats": _batch_stats(numbers, results, unique)}
+
+
+async def validate_phone_numbers_async(numbers, client, country_code=None, workers=BATCH_WORKERS):
+    """
+    Async variant of validate_phone_numbers() using a shared httpx client.
+    """
+    answers, pending, unique = _plan_batch(numbers, country_code)
+    semaphore = asyncio.Semaphore(max(1, workers))
+
+    async def lookup(number):
+        async with semaphore:
+            return await validate_phone_number_async(number, client)
+
+    looked_up = dict(zip(unique, await asyncio.gather(*(lookup(number) for number in unique.values()))))
+    for number, local in pending.items():
+        answers[number] = looked_up[local["number"]]
+
+    results = [answers[number] for number in numbers]
+    return {"results": [{"query": number, **result} for number, result in zip(numbers, results)],
+            "stats": _batch_stats(numbers, results, unique)}
+
+# Example usage
+if __name__ == "__main__":
+    # Replace with a phone number to test
+    result = validate_phone_number("141585862")
+    print(result)
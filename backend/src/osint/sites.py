@@ -1,3 +1,6 @@
+import os
+from urllib.parse import quote
+
 sites = {
     # Social Media Platforms
     "Facebook": "https://www.facebook.com/{}",
@@ -152,6 +155,11 @@ sites = {
     "BioHacking": "https://forum.dangerousthings.com/u/{}",
 }
 
+# Send every probe to one server instead (e.g. bench/mock_upstreams.py)
+_sites_url = os.getenv("SAGEMODE_SITES_URL")
+if _sites_url:
+    sites = {site: f"{_sites_url.rstrip('/')}/{quote(site)}/{{}}" for site in sites}
+
 # indicators for false positive 200 responses
 soft404_indicators = [
     "This profile could not be found",
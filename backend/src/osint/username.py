@@ -2,20 +2,61 @@
 """
 Sagemode: Track and Unveil Online identities across social media platforms.
 """
+import asyncio
 import os
+import queue
 import re
 import datetime
 import subprocess
 import threading
+import time
 import random
 import requests
 import json
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from urllib.parse import quote, urlsplit
 
 from bs4 import BeautifulSoup
 
+import telemetry
+from http_client import TIMEOUT
+
 from .sites import sites, soft404_indicators, user_agents
 
+# Upper bound on in-flight site probes per async search
+SITE_CONCURRENCY = int(os.getenv("SAGEMODE_CONCURRENCY", "50"))
+# Batch searches: probes in flight in total, and per host
+BATCH_CONCURRENCY = int(os.getenv("SAGEMODE_BATCH_CONCURRENCY", "64"))
+HOST_CONCURRENCY = int(os.getenv("SAGEMODE_HOST_CONCURRENCY", "4"))
+MAX_USERNAMES = int(os.getenv("SAGEMODE_MAX_USERNAMES", "500"))
+VARIANT_LIMIT = int(os.getenv("SAGEMODE_VARIANT_LIMIT", "12"))
+
+SEPARATORS = re.compile(r"[._\-\s]+")
+VARIANT_SUFFIXES = ("1", "123", "_", "0")
+
+
+def is_soft404(html_response: str) -> bool:
+    soup = BeautifulSoup(html_response, "html.parser")
+    page_title = soup.title.string.strip() if soup.title and soup.title.string else ""
+
+    for error_indicator in soft404_indicators:
+        if (
+            error_indicator.lower() in html_response.lower()
+            or error_indicator.lower() in page_title.lower()
+            or page_title.lower() == "instagram"
+            or page_title.lower() == "patreon logo"
+            or "sign in" in page_title.lower()
+        ):
+            return True
+    return False
+
+
+def looks_found(username: str, status_code: int, text: str) -> bool:
+    """Cheap checks a profile page must pass before the soft-404 parse."""
+    return status_code == 200 and username.lower() in text.lower()
+
 
 class Sagemode:
     def __init__(self, username: str, found_only=False):
@@ -25,42 +66,52 @@ class Sagemode:
         self.result_file = os.path.join(f"{self.username}.json")
         self.found_only = found_only
         self.results = {"found": [], "not_found": []}
+        self.lock = threading.Lock()
 
     def is_soft404(self, html_response: str) -> bool:
-        soup = BeautifulSoup(html_response, "html.parser")
-        page_title = soup.title.string.strip() if soup.title else ""
-
-        for error_indicator in soft404_indicators:
-            if (
-                error_indicator.lower() in html_response.lower()
-                or error_indicator.lower() in page_title.lower()
-                or page_title.lower() == "instagram"
-                or page_title.lower() == "patreon logo"
-                or "sign in" in page_title.lower()
-            ):
-                return True
-        return False
+        return is_soft404(html_response)
 
     def check_site(self, site: str, url: str, headers):
         url = url.format(self.username)
         try:
-            with requests.Session() as session:
-                response = session.get(url, headers=headers)
-
-            if (
-                response.status_code == 200
-                and self.username.lower() in response.text.lower()
-                and not self.is_soft404(response.text)
-            ):
-                with threading.Lock():
-                    self.positive_count += 1
+            with telemetry.span("site", traced=False, site=site), requests.Session() as session:
+                response = session.get(url, headers=headers, timeout=TIMEOUT)
+
+            self.record(site, url, response.status_code, response.text)
+        except Exception as e:
+            print(f"Error checking {site}: {e}")
+            #raise Exception(e)
+
+    def record(self, site: str, url: str, status_code: int, text: str):
+        if looks_found(self.username, status_code, text) and not self.is_soft404(text):
+            with self.lock:
+                self.positive_count += 1
                 self.results["found"].append({"site": site, "url": url})
-            else:
-                if not self.found_only:
+        else:
+            if not self.found_only:
+                with self.lock:
                     self.results["not_found"].append({"site": site})
+
+    async def check_site_async(self, site: str, url: str, headers, client, semaphore):
+        url = url.format(self.username)
+        try:
+            async with semaphore:
+                with telemetry.span("site", traced=False, site=site):
+                    response = await client.get(url, headers=headers)
+            # Soft-404 detection parses HTML; keep it off the event loop
+            await asyncio.to_thread(self.record, site, url, response.status_code, response.text)
         except Exception as e:
             print(f"Error checking {site}: {e}")
-            #raise Exception(e)
+
+    async def start_async(self, client, concurrency: int = SITE_CONCURRENCY):
+        headers = {"User-Agent": random.choice(user_agents)}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        await asyncio.gather(
+            *(self.check_site_async(site, url, headers, client, semaphore) for site, url in sites.items())
+        )
+
+        return self.results["found"]
 
 
     def start(self):
@@ -110,6 +161,234 @@ def sagemode_wrapper(username: str):
     return results
 
 
+async def sagemode_async(username: str, client):
+    """
+    Async variant of sagemode_wrapper() probing every site on one event loop.
+
+    Args:
+        username (str): The username to search for.
+        client (httpx.AsyncClient): Shared HTTP client.
+
+    Returns:
+        list: Sites where the username was found.
+    """
+    sage = Sagemode(username)
+    return await sage.start_async(client)
+
+
+def variants(username: str, limit: int = VARIANT_LIMIT):
+    """
+    Common spellings of a username: separators swapped ("john.doe",
+    "john_doe", "johndoe"), trailing digits dropped or added.
+
+    Returns:
+        list: Up to `limit` distinct usernames, `username` first.
+    """
+    username = username.strip()
+    stem = re.sub(r"\d+$", "", username) or username
+    parts = [part for part in SEPARATORS.split(stem) if part] or [stem]
+    joined = [separator.join(parts) for separator in ("", ".", "_", "-")] if len(parts) > 1 else [stem]
+    # Most sites match case-insensitively, so lowercase forms come first
+    candidates = [username, username.lower()] + [form.lower() for form in joined]
+    candidates += [joined[0].lower() + suffix for suffix in VARIANT_SUFFIXES] + joined
+
+    seen = []
+    for candidate in candidates:
+        if candidate and candidate not in seen:
+            seen.append(candidate)
+    return seen[:limit]
+
+
+def expand_usernames(usernames, with_variants=False, limit=MAX_USERNAMES):
+    """
+    Deduplicate a list of usernames, optionally adding their variants.
+
+    Raises:
+        ValueError: If more than `limit` usernames result.
+    """
+    expanded = []
+    for username in usernames:
+        if not isinstance(username, str) or not username.strip():
+            continue
+        for candidate in variants(username) if with_variants else [username.strip()]:
+            if candidate not in expanded:
+                expanded.append(candidate)
+    if len(expanded) > limit:
+        raise ValueError(f"Too many usernames ({len(expanded)}), the limit is {limit}")
+    return expanded
+
+
+class BatchSearch:
+    """
+    Probe many usernames across every site with one shared connection pool.
+
+    Probes are grouped by host into lanes of sequential requests, at most
+    `per_host` lanes per host, so each lane keeps its keep-alive connection
+    busy instead of every probe opening its own. Lanes of different hosts
+    run concurrently, up to `concurrency` probes in flight. Results are
+    yielded as they arrive.
+    """
+
+    def __init__(self, usernames, found_only=True, concurrency=BATCH_CONCURRENCY, per_host=HOST_CONCURRENCY):
+        self.usernames = usernames
+        self.found_only = found_only
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.headers = {"User-Agent": random.choice(user_agents)}
+        self.lanes = self._lanes()
+        self.probes = sum(len(lane) for lane in self.lanes)
+        self.done = 0
+        self.found = 0
+        self.errors = 0
+        # run() probes from many threads
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def _lanes(self):
+        probes = []
+        for site, template in sites.items():
+            for username in self.usernames:
+                url = template.format(quote(username, safe="@"))
+                probes.append((urlsplit(url).netloc.lower(), site, username, url))
+        probes.sort()
+
+        lanes = []
+        for host, group in groupby(probes, key=lambda probe: probe[0]):
+            group = list(group)
+            count = min(self.per_host, len(group))
+            for i in range(count):
+                lanes.append((i, host, group[i::count]))
+        # First lanes of every host before second lanes, so busy hosts
+        # do not take every slot while others wait
+        lanes.sort(key=lambda lane: (lane[0], lane[1]))
+        return [lane for _, _, lane in lanes]
+
+    def _result(self, site, username, url, status_code=None, found=False, error=None):
+        with self._lock:
+            self.done += 1
+            if error is not None:
+                self.errors += 1
+            elif found:
+                self.found += 1
+        if error is not None:
+            return {"username": username, "site": site, "error": error}
+        if found:
+            return {"username": username, "site": site, "url": url}
+        if not self.found_only:
+            return {"username": username, "site": site, "status": status_code, "found": False}
+        return None
+
+    def _probe(self, session, site, username, url):
+        try:
+            with telemetry.span("site", traced=False, site=site):
+                response = session.get(url, headers=self.headers, timeout=TIMEOUT)
+            found = looks_found(username, response.status_code, response.text) and not is_soft404(response.text)
+            return self._result(site, username, url, response.status_code, found)
+        except Exception as e:
+            return self._result(site, username, url, error=str(e))
+
+    def run(self):
+        """
+        Returns:
+            generator: One dict per found profile (or per probe unless
+            `found_only`), in completion order.
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=len(self.lanes) or 1, pool_maxsize=self.per_host)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        results = queue.Queue()
+        stop = threading.Event()
+
+        def run_lane(lane):
+            try:
+                for _, site, username, url in lane:
+                    if stop.is_set():
+                        break
+                    results.put(self._probe(session, site, username, url))
+            finally:
+                results.put(StopIteration)
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(self.lanes))))
+        try:
+            for lane in self.lanes:
+                pool.submit(run_lane, lane)
+            remaining = len(self.lanes)
+            while remaining:
+                result = results.get()
+                if result is StopIteration:
+                    remaining -= 1
+                elif result is not None:
+                    yield result
+        finally:
+            # Also reached when the consumer goes away mid-stream
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            session.close()
+
+    async def arun(self, client):
+        """Async variant of run() on a shared httpx client."""
+        results = asyncio.Queue()
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def probe(site, username, url):
+            try:
+                async with slots:
+                    with telemetry.span("site", traced=False, site=site):
+                        response = await client.get(url, headers=self.headers)
+                found = looks_found(username, response.status_code, response.text)
+                if found:
+                    # Soft-404 detection parses HTML; keep it off the event loop
+                    found = not await asyncio.to_thread(is_soft404, response.text)
+                return self._result(site, username, url, response.status_code, found)
+            except Exception as e:
+                return self._result(site, username, url, error=str(e))
+
+        async def run_lane(lane):
+            try:
+                for _, site, username, url in lane:
+                    await results.put(await probe(site, username, url))
+            finally:
+                await results.put(StopIteration)
+
+        tasks = [asyncio.create_task(run_lane(lane)) for lane in self.lanes]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                result = await results.get()
+                if result is StopIteration:
+                    remaining -= 1
+                elif result is not None:
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "usernames": len(self.usernames),
+            "probes": self.probes,
+            "completed": self.done,
+            "found": self.found,
+            "errors": self.errors,
+            "elapsed": round(elapsed, 3),
+        }
+
+
+def ndjson(search):
+    """Stream a batch search as JSON lines, ending with a {"stats": ...} line."""
+    for result in search.run():
+        yield json.dumps(result) + "\n"
+    yield json.dumps({"stats": search.stats()}) + "\n"
+
+
+async def ndjson_async(search, client):
+    async for result in search.arun(client):
+        yield json.dumps(result) + "\n"
+    yield json.dumps({"stats": search.stats()}) + "\n"
+
+
 def main():
 
     print(sagemode_wrapper("0xRavenspar"))
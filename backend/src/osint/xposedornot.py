@@ -1,36 +1,283 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
+from http_client import TIMEOUT
+from providers.governance import governor, ProviderUnavailable
+from providers import registry
+from store.breaches import catalog
+
+base_url = os.getenv("XPOSEDORNOT_URL", "https://api.xposedornot.com/v1/")
+
+# Emails looked up at once by checkEmails()
+BATCH_WORKERS = int(os.getenv("XPOSEDORNOT_BATCH_WORKERS", "4"))
+MAX_BATCH = int(os.getenv("XPOSEDORNOT_MAX_BATCH", "500"))
+
+# check-email and breach-analytics run side by side on this pool
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("XPOSEDORNOT_WORKERS", "16")))
+
+NOT_FOUND = {"error": "Email address not found in any breach database!"}
+
+
+def _get(path, params=None):
+    response = requests.get(f"{base_url}{path}", params=params, timeout=TIMEOUT)
+    _check_status(response)
+    return response.json()
+
 
 def breachAnalytics(email: str) -> dict:
-    url = f"https://api.xposedornot.com/v1/breach-analytics?email={email}"
+    return _get("breach-analytics", {"email": email})
 
-    results = requests.get(url).json()
 
-    return results
+def breachNames(email: str) -> list:
+    """Names of the breaches an email appears in, from check-email; [] if none."""
+    return _breach_names(_get(f"check-email/{email}"))
 
 
 def checkEmail(email: str) -> dict:
-    url = f"https://api.xposedornot.com/v1/check-email/{email}"
+    # Both requests go out together; analytics is dropped for unknown emails
+    analytics = _pool.submit(breachAnalytics, email)
+    try:
+        names = breachNames(email)
+    except Exception:
+        analytics.cancel()
+        raise
+
+    if not names:
+        analytics.cancel()
+        return NOT_FOUND
+
+    try:
+        return _summarize(analytics.result(), names)
+    except requests.RequestException as e:
+        return _from_catalog(names, str(e))
+
+
+async def checkEmail_async(email: str, client) -> dict:
+    found, analytics = await asyncio.gather(
+        client.get(f"{base_url}check-email/{email}"),
+        client.get(f"{base_url}breach-analytics", params={"email": email}),
+        return_exceptions=True,
+    )
+    if isinstance(found, BaseException):
+        raise found
+    _check_status(found)
+    names = _breach_names(found.json())
+    if not names:
+        return NOT_FOUND
+
+    try:
+        if isinstance(analytics, BaseException):
+            raise analytics
+        _check_status(analytics)
+        return _summarize(analytics.json(), names)
+    except Exception as e:
+        return _from_catalog(names, str(e))
 
-    results = requests.get(url).json()
 
+def _check_status(response):
+    # Unknown emails come back as 404 with an "Error" body; only throttling
+    # and server errors are failures.
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+
+
+def _breach_names(results: dict) -> list:
     if "Error" in results:
-        return {"error": "Email address not found in any breach database!"}
+        return []
+    # {"breaches": [["Adobe", "LinkedIn"]]}
+    names = []
+    for group in results.get("breaches") or []:
+        names.extend(group if isinstance(group, list) else [group])
+    return names
 
-    breach_analytics = breachAnalytics(email)
 
+def _summarize(breach_analytics: dict, names=()) -> dict:
     breaches = []
-    for breach in breach_analytics["ExposedBreaches"]["breaches_details"]:
+    for breach in (breach_analytics.get("ExposedBreaches") or {}).get("breaches_details") or []:
         breaches.append(breach)
+    catalog.upsert(breaches)
 
-    password_strengths = breach_analytics["BreachMetrics"]["passwords_strength"]
+    # Breaches check-email knows of but analytics left out
+    listed = {breach.get("breach") for breach in breaches}
+    missing = [name for name in names if name not in listed]
+    if missing:
+        known = catalog.get_many(missing)
+        breaches.extend(known[name] for name in missing if name in known)
 
-    risk = breach_analytics["BreachMetrics"]["risk"]
+    metrics = breach_analytics.get("BreachMetrics") or {}
+    password_strengths = metrics.get("passwords_strength")
+
+    risk = metrics.get("risk")
 
     results = {
+        "breach_ids": list(names) or [breach.get("breach") for breach in breaches],
         "breaches": breaches,
         "password_strength": password_strengths,
         "risk": risk,
     }
 
     return results
+
+
+def _from_catalog(names, error):
+    """Answer from check-email and the breach catalog when analytics failed."""
+    known = catalog.get_many(names)
+    return {
+        "breach_ids": names,
+        "breaches": [known[name] for name in names if name in known],
+        "password_strength": None,
+        "risk": None,
+        "error": f"Breach analytics unavailable: {error}",
+        # Partial answer; kept out of the caches so the next lookup retries
+        "stale": True,
+    }
+
+
+# -- breach catalog -----------------------------------------------------------
+
+def syncBreachCatalog() -> int:
+    """Download XposedOrNot's breach listing into the local catalog."""
+    listing = _get("breaches").get("exposedBreaches") or []
+    return catalog.replace_listing(listing)
+
+
+async def syncBreachCatalog_async(client) -> int:
+    response = await client.get(f"{base_url}breaches")
+    _check_status(response)
+    listing = response.json().get("exposedBreaches") or []
+    return await asyncio.to_thread(catalog.replace_listing, listing)
+
+
+def _unknown(names):
+    return [name for name in names if name not in catalog.get_many(names)]
+
+
+# -- batches ------------------------------------------------------------------
+
+def _batch_entry(email, result):
+    if "breach_ids" not in result:
+        return {"email": email, **result}
+    entry = {"email": email, "breach_ids": result["breach_ids"]}
+    for key in ("password_strength", "risk", "error", "stale"):
+        if result.get(key) is not None:
+            entry[key] = result[key]
+    return entry
+
+
+def _batch_result(emails, entries):
+    names = sorted({name for entry in entries.values() for name in entry.get("breach_ids", [])})
+    breaches = catalog.get_many(names)
+    results = [entries[email] for email in emails]
+    return {
+        "results": results,
+        # Each breach's details once, however many emails it appears in
+        "breaches": breaches,
+        "stats": {
+            "emails": len(emails),
+            "breached": sum(1 for entry in results if entry.get("breach_ids")),
+            "not_found": sum(1 for entry in results if entry.get("error") == NOT_FOUND["error"]),
+            "errors": sum(1 for entry in results if "error" in entry and "breach_ids" not in entry
+                          and entry["error"] != NOT_FOUND["error"]),
+            "breaches": len(names),
+            "unknown_breaches": len(names) - len(breaches),
+        },
+    }
+
+
+def _names_only(email):
+    names = breachNames(email)
+    return {"breach_ids": names} if names else NOT_FOUND
+
+
+def _cache(email, result):
+    if not result.get("stale"):
+        registry.cache.set(("xposedornot", email), result, registry.get("xposedornot").ttl)
+
+
+def _lookup(email, analytics):
+    # Shares the registry's cache of full /footprint lookups
+    cached = registry.cache.get(("xposedornot", email))
+    if cached is not None:
+        return cached
+    if analytics:
+        result = governor.call("xposedornot", email, checkEmail, email)
+        _cache(email, result)
+        return result
+    return governor.call("xposedornot", f"names:{email}", _names_only, email)
+
+
+def checkEmails(emails: list, analytics: bool = False, workers: int = BATCH_WORKERS) -> dict:
+    """
+    Look up a list of emails, a few at a time.
+
+    By default only check-email is queried and breach details come from
+    the local catalog, which is synced from XposedOrNot's listing when it
+    meets unknown breach names; `analytics` adds each email's password
+    strength and risk (breach-analytics) at the cost of a second call.
+
+    Returns:
+        dict: "results" per email (breach names only), "breaches" with the
+        details of every breach named, and "stats".
+    """
+    emails = list(dict.fromkeys(emails))
+
+    def one(email):
+        try:
+            return email, _batch_entry(email, _lookup(email, analytics))
+        except (requests.RequestException, ProviderUnavailable) as e:
+            return email, {"email": email, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        entries = dict(pool.map(one, emails))
+
+    names = {name for entry in entries.values() for name in entry.get("breach_ids", [])}
+    if _unknown(sorted(names)) and catalog.needs_sync():
+        try:
+            governor.call("xposedornot", "breaches", syncBreachCatalog)
+        except (requests.RequestException, ProviderUnavailable) as e:
+            print(f"Error syncing the breach catalog: {str(e)}")
+    return _batch_result(emails, entries)
+
+
+async def checkEmails_async(emails: list, client, analytics: bool = False, workers: int = BATCH_WORKERS) -> dict:
+    """
+    Async variant of checkEmails() using a shared httpx client.
+    """
+    import httpx
+
+    emails = list(dict.fromkeys(emails))
+    semaphore = asyncio.Semaphore(max(1, workers))
+
+    async def names_only(email):
+        response = await client.get(f"{base_url}check-email/{email}")
+        _check_status(response)
+        names = _breach_names(response.json())
+        return {"breach_ids": names} if names else NOT_FOUND
+
+    async def one(email):
+        cached = registry.cache.get(("xposedornot", email))
+        if cached is not None:
+            return email, _batch_entry(email, cached)
+        try:
+            async with semaphore:
+                if analytics:
+                    result = await governor.acall("xposedornot", email, lambda: checkEmail_async(email, client))
+                    _cache(email, result)
+                else:
+                    result = await governor.acall("xposedornot", f"names:{email}", lambda: names_only(email))
+            return email, _batch_entry(email, result)
+        except (httpx.HTTPError, ProviderUnavailable) as e:
+            return email, {"email": email, "error": str(e)}
+
+    entries = dict(await asyncio.gather(*(one(email) for email in emails)))
+
+    names = sorted({name for entry in entries.values() for name in entry.get("breach_ids", [])})
+    if await asyncio.to_thread(_unknown, names) and await asyncio.to_thread(catalog.needs_sync):
+        try:
+            await governor.acall("xposedornot", "breaches", lambda: syncBreachCatalog_async(client))
+        except (httpx.HTTPError, ProviderUnavailable) as e:
+            print(f"Error syncing the breach catalog: {str(e)}")
+    return await asyncio.to_thread(_batch_result, emails, entries)
@@ -0,0 +1,88 @@
+"""
+Bounded-memory "have we seen this IOC?" check for log ingestion.
+
+Recently seen values live in a small exact LRU; everything else is
+remembered by a Bloom filter sized for the expected number of distinct
+values. A Bloom false positive makes a new IOC look like a duplicate, so
+with the default error rate about one in a thousand uniques is skipped;
+nothing is ever reported twice.
+"""
+import hashlib
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+
+class BloomFilter:
+    def __init__(self, capacity=10_000_000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        # Kirsch-Mitzenmacher double hashing: k positions from two hashes
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value: str) -> bool:
+        """
+        Add `value`.
+
+        Returns:
+            bool: True if it was (probably) present already.
+        """
+        present = True
+        bits = self.bits
+        for position in self._positions(value):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def memory(self):
+        return int(self.bits.nbytes)
+
+
+class Deduplicator:
+    def __init__(self, capacity=10_000_000, error_rate=0.001, recent=100_000):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.recent = OrderedDict()
+        self.recent_size = recent
+        self.seen = 0
+        self.unique = 0
+
+    def is_new(self, value: str) -> bool:
+        self.seen += 1
+        # Logs repeat the same handful of IOCs in bursts; the LRU answers
+        # those without hashing.
+        if value in self.recent:
+            self.recent.move_to_end(value)
+            return False
+        self.recent[value] = None
+        if len(self.recent) > self.recent_size:
+            self.recent.popitem(last=False)
+        if self.bloom.add(value):
+            return False
+        self.unique += 1
+        return True
+
+    def stats(self):
+        return {
+            "seen": self.seen,
+            "unique": self.unique,
+            "bloom_bytes": self.bloom.memory,
+            "bloom_capacity": self.bloom.capacity,
+        }
@@ -0,0 +1,282 @@
+"""
+Streaming IOC extraction and enrichment for log files.
+
+Files are read in large chunks cut at line boundaries, split into tokens
+and the distinct tokens are classified with precompiled patterns as
+IPv4/IPv6 addresses, domains, emails or MD5/SHA1/SHA256 hashes. New IOCs (see pipeline.dedup) are enriched in
+batches through the provider registry and written out as JSON lines as
+each batch completes. Only local feeds (cost 0 providers: GeoIP, Talos,
+Tor, Tranco) are used unless remote providers are enabled, and those go
+through the registry's cache and the provider governor.
+
+    python -m pipeline.ingest firewall.log proxy.log.gz -o iocs.jsonl
+    python -m pipeline.ingest firewall.log --remote --batch-size 200
+"""
+import gzip
+import ipaddress
+import json
+import os
+import re
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+import telemetry
+from attack import suffixes
+from pipeline.dedup import Deduplicator
+from providers import registry
+from risk.scoring import calculate_risk_score
+
+load_dotenv()
+
+CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", str(8 * 1024 * 1024)))
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+CAPACITY = int(os.getenv("INGEST_BLOOM_CAPACITY", "10000000"))
+ERROR_RATE = float(os.getenv("INGEST_BLOOM_ERROR_RATE", "0.001"))
+REMOTE_WORKERS = int(os.getenv("INGEST_REMOTE_WORKERS", "16"))
+
+# Bytes that can appear in an IOC; everything else splits tokens. Logs
+# repeat the same tokens heavily, so each chunk is reduced to its set of
+# distinct tokens (all C-level work) before any per-token regex runs.
+TOKEN_BYTES = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789._:@%+-"
+TOKEN_TABLE = bytes(byte if byte in TOKEN_BYTES else 32 for byte in range(256))
+
+_OCTET = r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+IPV4_REGEX = re.compile(rf"{_OCTET}(?:\.{_OCTET}){{3}}")
+EMAIL_REGEX = re.compile(r"[A-Za-z0-9._%+-]+@(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,63}")
+HASH_REGEX = re.compile(r"[0-9A-Fa-f]+")
+DOMAIN_REGEX = re.compile(r"(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}")
+
+HASH_TYPES = {32: "md5", 40: "sha1", 64: "sha256"}
+
+# Used to drop "file.ext" matches when the Public Suffix List is unavailable
+FILE_EXTENSIONS = frozenset((
+    "bak", "bin", "cfg", "conf", "css", "csv", "dat", "dll", "exe", "gif", "gz", "htm", "html", "ico",
+    "ini", "jpeg", "jpg", "js", "json", "jsp", "log", "php", "png", "py", "sh", "svg", "tar", "tmp", "txt",
+    "woff", "xml", "yaml", "yml",
+))
+
+# Registry input type per IOC type; hashes have no provider yet
+PROVIDER_INPUT = {"ipv4": "ip", "ipv6": "ip", "domain": "domain", "email": "email"}
+
+
+def _tlds():
+    exact, _, _ = suffixes.load()
+    return frozenset(rule for rule in exact if "." not in rule)
+
+
+def read_chunks(stream, chunk_size=CHUNK_SIZE):
+    """Yield byte chunks from a binary stream, cut at line ends."""
+    remainder = b""
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            break
+        block = remainder + block
+        cut = block.rfind(b"\n")
+        if cut < 0:
+            remainder = block
+            continue
+        remainder = block[cut + 1:]
+        yield block[:cut + 1]
+    if remainder:
+        yield remainder
+
+
+def open_log(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def open_upload(stream, filename):
+    """Wrap an uploaded file's stream, decompressing .gz uploads on the fly."""
+    if filename.endswith(".gz"):
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    return stream
+
+
+class Pipeline:
+    def __init__(self, remote=False, batch_size=BATCH_SIZE, capacity=CAPACITY, error_rate=ERROR_RATE,
+                 workers=REMOTE_WORKERS):
+        self.remote = remote
+        self.batch_size = batch_size
+        self.workers = workers
+        self.dedup = Deduplicator(capacity, error_rate)
+        self.tlds = _tlds()
+        self.lines = 0
+        self.bytes = 0
+        self.enriched = 0
+        # Local feeds that failed once (e.g. missing and undownloadable)
+        # are skipped for the rest of the run instead of per IOC.
+        self.disabled = set()
+        self.started = time.monotonic()
+
+    # -- extraction -----------------------------------------------------
+
+    def _domain(self, value):
+        value = value.lower()
+        tld = value.rsplit(".", 1)[1]
+        if self.tlds:
+            return value if tld in self.tlds else None
+        return None if tld in FILE_EXTENSIONS else value
+
+    def classify(self, token: str):
+        """
+        Returns:
+            tuple: (type, normalized value), or None if `token` is no IOC.
+        """
+        token = token.strip("._:%+-")
+        if "@" in token:
+            return ("email", token.lower()) if EMAIL_REGEX.fullmatch(token) else None
+        if token.count(":") == 1:
+            # host:port
+            token = token.split(":", 1)[0]
+        if ":" in token:
+            try:
+                return "ipv6", ipaddress.IPv6Address(token).compressed
+            except ValueError:
+                # times, MAC addresses and other colon-separated noise
+                return None
+        if IPV4_REGEX.fullmatch(token):
+            return "ipv4", token
+        if len(token) in HASH_TYPES and HASH_REGEX.fullmatch(token):
+            return HASH_TYPES[len(token)], token.lower()
+        if "." in token and DOMAIN_REGEX.fullmatch(token):
+            value = self._domain(token)
+            return ("domain", value) if value else None
+        return None
+
+    def extract(self, chunk: bytes):
+        """Return the distinct (type, value) IOCs in a chunk of log lines, sorted."""
+        iocs = set()
+        for token in set(chunk.translate(TOKEN_TABLE).split()):
+            if len(token) < 4:
+                continue
+            ioc = self.classify(token.decode("ascii"))
+            if ioc is not None:
+                iocs.add(ioc)
+        return sorted(iocs)
+
+    # -- enrichment -----------------------------------------------------
+
+    def _providers(self, input_type):
+        return [
+            provider for provider in registry.providers_for(input_type)
+            if (self.remote or provider.cost == 0) and provider.name not in self.disabled
+        ]
+
+    def _enrich_one(self, kind, value):
+        record = {"type": kind, "value": value}
+        input_type = PROVIDER_INPUT.get(kind)
+        if input_type is None:
+            return record
+        results = {}
+        for provider in self._providers(input_type):
+            try:
+                results[provider.name] = registry.call(provider.name, value)
+            except Exception as e:
+                results.setdefault("errors", {})[provider.name] = str(e)
+                if provider.cost == 0 and provider.name not in self.disabled:
+                    print(f"Error in {provider.name}, skipping it for this run: {str(e)}", file=sys.stderr)
+                    self.disabled.add(provider.name)
+        if input_type in ("ip", "domain"):
+            results["risk"] = calculate_risk_score(results)
+        record["results"] = results
+        return record
+
+    def enrich(self, batch, pool=None):
+        with telemetry.span("ingest_batch"):
+            if pool is None:
+                return [self._enrich_one(kind, value) for kind, value in batch]
+            return list(pool.map(lambda item: self._enrich_one(*item), batch))
+
+    # -- driver ---------------------------------------------------------
+
+    def process(self, stream):
+        """
+        Run the pipeline over a binary stream.
+
+        Returns:
+            generator: Lists of enriched records, one per batch.
+        """
+        # Remote lookups are I/O bound; local ones stay on this thread
+        pool = ThreadPoolExecutor(max_workers=self.workers) if self.remote else None
+        try:
+            batch = []
+            for chunk in read_chunks(stream):
+                self.lines += chunk.count(b"\n")
+                self.bytes += len(chunk)
+                for kind, value in self.extract(chunk):
+                    if self.dedup.is_new(value):
+                        batch.append((kind, value))
+                        if len(batch) >= self.batch_size:
+                            yield self.enrich(batch, pool)
+                            self.enriched += len(batch)
+                            batch = []
+            if batch:
+                yield self.enrich(batch, pool)
+                self.enriched += len(batch)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "unique_iocs": self.dedup.unique,
+            "enriched": self.enriched,
+            "elapsed": round(elapsed, 3),
+            "lines_per_sec": round(self.lines / elapsed) if elapsed else 0,
+            "bloom_bytes": self.dedup.bloom.memory,
+        }
+
+
+def ndjson(pipeline, stream):
+    """
+    Stream a pipeline run as newline-delimited JSON for the /ingest
+    endpoints: one line per IOC, then a final {"stats": ...} line.
+    """
+    for records in pipeline.process(stream):
+        yield "".join(json.dumps(record) + "\n" for record in records)
+    yield json.dumps({"stats": pipeline.stats()}) + "\n"
+
+
+def main():
+    parser = ArgumentParser(description="Extract and enrich IOCs from log files")
+    parser.add_argument("files", nargs="+", help="log files, optionally gzipped ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--remote", action="store_true", help="also query remote providers")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--capacity", type=int, default=CAPACITY, help="expected number of distinct IOCs")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(remote=args.remote, batch_size=args.batch_size, capacity=args.capacity)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    last_report = time.monotonic()
+    try:
+        for path in args.files:
+            stream = sys.stdin.buffer if path == "-" else open_log(path)
+            try:
+                for records in pipeline.process(stream):
+                    out.write("".join(json.dumps(record) + "\n" for record in records))
+                    out.flush()
+                    if time.monotonic() - last_report >= 5:
+                        last_report = time.monotonic()
+                        print(json.dumps(pipeline.stats()), file=sys.stderr)
+            finally:
+                if stream is not sys.stdin.buffer:
+                    stream.close()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(pipeline.stats()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
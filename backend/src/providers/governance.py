@@ -0,0 +1,352 @@
+"""
+Upstream provider governance.
+
+Every call to a rate-limited upstream goes through `governor.call()` (or
+`governor.acall()` from async code), which applies, in order:
+
+- a circuit breaker that opens on an error spike and short-circuits to the
+  last good result for the same key (marked "stale") until the cooldown ends
+- an adaptive (AIMD) concurrency limit that halves on 429s/timeouts and
+  creeps back up on success
+- a token bucket, stored in SQLite so every worker process on the host
+  draws from the same budget
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+database_location = os.getenv("RATELIMIT_DB_PATH", "media/ratelimits.db")
+
+# Longest a caller will wait for a token before giving up on the provider
+MAX_WAIT = float(os.getenv("RATELIMIT_MAX_WAIT", "5"))
+CACHE_SIZE = int(os.getenv("PROVIDER_CACHE_SIZE", "10000"))
+
+
+class ProviderUnavailable(Exception):
+    pass
+
+
+class Policy:
+    def __init__(self, rate, burst, failure_ratio=0.5, min_calls=5, window=30.0,
+                 cooldown=30.0, min_concurrency=1, max_concurrency=32):
+        self.rate = rate  # tokens per second
+        self.burst = burst
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+
+
+# Published free-tier limits, with some headroom.
+POLICIES = {
+    "ipapi": Policy(rate=15 / 60, burst=5, max_concurrency=4),
+    "internetdb": Policy(rate=1.0, burst=5),
+    "threatfox": Policy(rate=2.0, burst=10),
+    "tranco": Policy(rate=1.0, burst=5),
+    "xposedornot": Policy(rate=1.0, burst=2, max_concurrency=4),
+    "numverify": Policy(rate=0.5, burst=2, max_concurrency=2),
+}
+DEFAULT_POLICY = Policy(rate=5.0, burst=10)
+
+
+def policy_for(provider):
+    policy = POLICIES.get(provider, DEFAULT_POLICY)
+    # e.g. PROVIDER_IPAPI_RATE=0.75
+    rate = os.getenv(f"PROVIDER_{provider.upper()}_RATE")
+    burst = os.getenv(f"PROVIDER_{provider.upper()}_BURST")
+    concurrency = os.getenv(f"PROVIDER_{provider.upper()}_CONCURRENCY")
+    if rate or burst or concurrency:
+        policy = Policy(
+            rate=float(rate or policy.rate),
+            burst=float(burst or policy.burst),
+            failure_ratio=policy.failure_ratio,
+            min_calls=policy.min_calls,
+            window=policy.window,
+            cooldown=policy.cooldown,
+            min_concurrency=policy.min_concurrency,
+            max_concurrency=int(concurrency or policy.max_concurrency),
+        )
+    return policy
+
+
+class TokenBucket:
+    """Token buckets persisted in SQLite and shared by all local workers."""
+
+    def __init__(self, path=None):
+        self.path = path or database_location
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (provider TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, provider, policy):
+        """
+        Take one token.
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one is due.
+        """
+        conn = self._conn()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front so concurrent workers
+        # serialise on the read-modify-write.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE provider = ?", (provider,)).fetchone()
+            tokens = policy.burst if row is None else min(policy.burst, row[0] + (now - row[1]) * policy.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / policy.rate
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (provider, tokens, updated_at) VALUES (?, ?, ?)",
+                (provider, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.outcomes = deque()
+        # Start of the outstanding half-open trial call, if any
+        self.trial_started = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.policy.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                # Let a single trial call through; a trial that never
+                # reported back (e.g. a cancelled task) is replaced after a cooldown
+                if self.trial_started is not None and now - self.trial_started < self.policy.cooldown:
+                    return False
+                self.trial_started = now
+            return True
+
+    def release(self):
+        """Give back an admitted call that never reached the provider."""
+        with self.lock:
+            self.trial_started = None
+
+    def record(self, ok):
+        with self.lock:
+            now = time.monotonic()
+            self.trial_started = None
+            if self.state == self.HALF_OPEN:
+                if ok:
+                    self.state = self.CLOSED
+                    self.outcomes.clear()
+                else:
+                    self.state = self.OPEN
+                    self.opened_at = now
+                return
+
+            self.outcomes.append((now, ok))
+            while self.outcomes and now - self.outcomes[0][0] > self.policy.window:
+                self.outcomes.popleft()
+
+            failures = sum(1 for _, success in self.outcomes if not success)
+            if (
+                len(self.outcomes) >= self.policy.min_calls
+                and failures / len(self.outcomes) >= self.policy.failure_ratio
+            ):
+                self.state = self.OPEN
+                self.opened_at = now
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: +1 per limit-sized run of successes, halve on overload."""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.limit = float(policy.max_concurrency)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def try_acquire(self):
+        with self.condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.in_flight < int(self.limit), timeout=timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, overloaded):
+        with self.condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.policy.min_concurrency, self.limit / 2)
+            else:
+                self.limit = min(self.policy.max_concurrency, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+def is_overload(error):
+    """429s, 503s and timeouts mean the upstream wants us to back off."""
+    if isinstance(error, TimeoutError):
+        return True
+    # An HTTP library that was never imported cannot have raised
+    for module, name in (("requests", "Timeout"), ("httpx", "TimeoutException")):
+        if module in sys.modules and isinstance(error, getattr(sys.modules[module], name)):
+            return True
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) in (429, 503)
+
+
+class Governor:
+    def __init__(self, bucket=None):
+        self.bucket = bucket or TokenBucket()
+        self.breakers = {}
+        self.limiters = {}
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _state(self, provider):
+        with self.lock:
+            if provider not in self.breakers:
+                policy = policy_for(provider)
+                self.breakers[provider] = CircuitBreaker(policy)
+                self.limiters[provider] = AdaptiveLimiter(policy)
+            return policy_for(provider), self.breakers[provider], self.limiters[provider]
+
+    def _remember(self, provider, key, result):
+        # Degraded answers are not a good result to fall back on
+        if isinstance(result, dict) and result.get("stale"):
+            return
+        with self.lock:
+            self.cache[(provider, key)] = result
+            self.cache.move_to_end((provider, key))
+            while len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+
+    def _fallback(self, provider, key, reason):
+        with self.lock:
+            cached = self.cache.get((provider, key))
+        if isinstance(cached, dict):
+            return {**cached, "stale": True}
+        raise ProviderUnavailable(f"{provider} unavailable: {reason}")
+
+    def status(self):
+        with self.lock:
+            return {
+                provider: {
+                    "circuit": breaker.state,
+                    "concurrency_limit": round(self.limiters[provider].limit, 2),
+                    "in_flight": self.limiters[provider].in_flight,
+                }
+                for provider, breaker in self.breakers.items()
+            }
+
+    def call(self, provider, key, func, *args, **kwargs):
+        policy, breaker, limiter = self._state(provider)
+        if not breaker.allow():
+            return self._fallback(provider, key, "circuit open")
+
+        deadline = time.monotonic() + MAX_WAIT
+        wait = self.bucket.take(provider, policy)
+        while wait:
+            if time.monotonic() + wait > deadline:
+                breaker.release()
+                return self._fallback(provider, key, "rate limited")
+            time.sleep(wait)
+            wait = self.bucket.take(provider, policy)
+
+        if not limiter.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            breaker.release()
+            return self._fallback(provider, key, "concurrency limit reached")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            limiter.release(overloaded=is_overload(e))
+            breaker.record(False)
+            raise
+        limiter.release(overloaded=False)
+        breaker.record(True)
+        self._remember(provider, key, result)
+        return result
+
+    async def acall(self, provider, key, coro_factory):
+        """
+        Async variant of call().
+
+        Args:
+            coro_factory (callable): Returns the coroutine to await; only
+                invoked once the call has been admitted.
+        """
+        policy, breaker, limiter = self._state(provider)
+        if not breaker.allow():
+            return self._fallback(provider, key, "circuit open")
+
+        deadline = time.monotonic() + MAX_WAIT
+        # The bucket lives in SQLite; keep its lock wait off the event loop
+        wait = await asyncio.to_thread(self.bucket.take, provider, policy)
+        while wait:
+            if time.monotonic() + wait > deadline:
+                breaker.release()
+                return self._fallback(provider, key, "rate limited")
+            await asyncio.sleep(wait)
+            wait = await asyncio.to_thread(self.bucket.take, provider, policy)
+
+        delay = 0.005
+        while not limiter.try_acquire():
+            if time.monotonic() + delay > deadline:
+                breaker.release()
+                return self._fallback(provider, key, "concurrency limit reached")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.25)
+        try:
+            result = await coro_factory()
+        except Exception as e:
+            limiter.release(overloaded=is_overload(e))
+            breaker.record(False)
+            raise
+        limiter.release(overloaded=False)
+        breaker.record(True)
+        self._remember(provider, key, result)
+        return result
+
+
+governor = Governor()
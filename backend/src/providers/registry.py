@@ -0,0 +1,179 @@
+"""
+Provider registry.
+
+Each provider declares which input types it accepts, its relative cost and
+how long its results stay fresh. Provider modules are only imported the
+first time they are called, so importing the app does no network or heavy
+library work and workers boot quickly.
+"""
+import importlib
+import threading
+import time
+from collections import OrderedDict
+
+import telemetry
+from providers.governance import governor
+
+
+class Provider:
+    def __init__(self, name, module, func, async_func=None, input_types=(), cost=1, ttl=0,
+                 governed=True, needs_client=True):
+        self.name = name
+        self.module = module
+        self.func = func
+        self.async_func = async_func
+        self.input_types = tuple(input_types)
+        # Upstream requests per lookup; 0 for local feeds
+        self.cost = cost
+        # Seconds a result may be served from cache; 0 disables caching
+        self.ttl = ttl
+        # Remote providers go through rate limiting and circuit breaking
+        self.governed = governed
+        # Whether the async variant takes the shared httpx client
+        self.needs_client = needs_client
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self.module)
+        return self._module
+
+    def resolve(self, asynchronous=False):
+        name = self.async_func if asynchronous else self.func
+        if name is None:
+            raise NotImplementedError(f"{self.name} has no {'async' if asynchronous else 'sync'} implementation")
+        return getattr(self.load(), name)
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "input_types": list(self.input_types),
+            "cost": self.cost,
+            "ttl": self.ttl,
+            "governed": self.governed,
+            "loaded": self._module is not None,
+        }
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (
+        # Answered from the local GeoIP database; the ip-api fallback is governed inside the provider
+        Provider("ipapi", "attack.ipapi", "ipapi", "ipapi_async", input_types=("ip",), cost=0, ttl=86400,
+                 governed=False),
+        Provider("talos", "attack.talos", "talos", "talos_async", input_types=("ip",), cost=0,
+                 governed=False, needs_client=False),
+        Provider("tor", "attack.tor", "tor", "tor_async", input_types=("ip",), cost=0,
+                 governed=False, needs_client=False),
+        Provider("internetdb", "osint.internetdb", "internetdb", "internetdb_async", input_types=("ip",),
+                 cost=1, ttl=3600),
+        # Answered from the local index; the optional API fallback is governed inside the provider
+        Provider("tranco", "attack.tranco", "tranco", "tranco_async", input_types=("domain",), cost=0,
+                 governed=False),
+        Provider("threatfox", "attack.threatfox", "threatfox", "threatfox_async", input_types=("domain",),
+                 cost=1, ttl=900),
+        Provider("xposedornot", "osint.xposedornot", "checkEmail", "checkEmail_async", input_types=("email",),
+                 cost=2, ttl=86400),
+        # Validated offline first; NumVerify calls are governed and cached per E.164 number inside the provider
+        Provider("numverify", "osint.phone", "validate_phone_number", "validate_phone_number_async",
+                 input_types=("phone",), cost=1, governed=False),
+        # Fans out to every site in osint.sites; governed per site, not as a whole
+        Provider("sagemode", "osint.username", "sagemode_wrapper", "sagemode_async", input_types=("username",),
+                 cost=150, ttl=3600, governed=False),
+    )
+}
+
+
+class TTLCache:
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+cache = TTLCache()
+
+
+def get(name):
+    try:
+        return PROVIDERS[name]
+    except KeyError:
+        raise KeyError(f"Unknown provider {name!r}. Registered are: {', '.join(PROVIDERS)}")
+
+
+def providers_for(input_type):
+    return [provider for provider in PROVIDERS.values() if input_type in provider.input_types]
+
+
+def _cached(name, query):
+    cached = cache.get((name, query))
+    if cached is not None:
+        telemetry.inc("provider_cache_hits_total", provider=name)
+    return cached
+
+
+def _store(provider, query, result):
+    if isinstance(result, dict) and result.get("stale"):
+        telemetry.inc("provider_stale_total", provider=provider.name)
+    # Don't pin stale fallbacks for a whole TTL
+    elif provider.ttl:
+        cache.set((provider.name, query), result, provider.ttl)
+
+
+def call(name, query):
+    provider = get(name)
+    if provider.ttl:
+        cached = _cached(name, query)
+        if cached is not None:
+            return cached
+
+    func = provider.resolve()
+    with telemetry.span("provider", provider=name):
+        if provider.governed:
+            result = governor.call(name, query, func, query)
+        else:
+            result = func(query)
+
+    _store(provider, query, result)
+    return result
+
+
+async def acall(name, query, client=None):
+    provider = get(name)
+    if provider.ttl:
+        cached = _cached(name, query)
+        if cached is not None:
+            return cached
+
+    func = provider.resolve(asynchronous=True)
+    factory = (lambda: func(query, client)) if provider.needs_client else (lambda: func(query))
+    with telemetry.span("provider", provider=name):
+        if provider.governed:
+            result = await governor.acall(name, query, factory)
+        else:
+            result = await factory()
+
+    _store(provider, query, result)
+    return result
@@ -0,0 +1,194 @@
+"""
+Risk scoring engine.
+
+Weights and rules live in a declarative JSON model (see model.json). The
+model is compiled once into weight/cap vectors so that many results can be
+scored together: features are extracted column by column into a NumPy
+matrix and the score is a single capped dot product per row.
+"""
+import json
+import os
+from argparse import ArgumentParser
+
+import numpy as np
+
+import telemetry
+
+model_location = os.getenv(
+    "RISK_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.json")
+)
+
+OPS = ("count", "flag", "match", "value", "weighted")
+
+
+def lookup(results, path):
+    value = results
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+class Rule:
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.op = spec.get("op", "count")
+        if self.op not in OPS:
+            raise ValueError(f"Unsupported op {self.op!r} in rule {self.name!r}. Supported are: {', '.join(OPS)}")
+        self.path = tuple(spec["feature"].split("."))
+        self.weight = float(spec.get("weight", 0))
+        self.cap = float(spec["cap"]) if spec.get("cap") is not None else np.inf
+        self.values = frozenset(spec.get("values", []))
+        self.detail = spec.get("detail")
+        # "weighted": sum per-item weights looked up by one field of each
+        # item in a list of dicts, e.g. CVE severities.
+        self.field = spec.get("field")
+        self.item_weights = {str(key).lower(): float(value) for key, value in spec.get("weights", {}).items()}
+        self.default_weight = float(spec.get("default_weight", 0))
+        self.fallback = tuple(spec["fallback"].split(".")) if spec.get("fallback") else None
+        if self.op == "match" and not self.values:
+            raise ValueError(f"Rule {self.name!r} uses op 'match' but defines no values")
+        if self.op == "weighted" and not (self.field and self.item_weights):
+            raise ValueError(f"Rule {self.name!r} uses op 'weighted' but defines no field or weights")
+
+    def _labels(self, results):
+        items = lookup(results, self.path)
+        if items is None and self.fallback:
+            # Results recorded before the feature existed: every item of the
+            # fallback list counts with the default weight.
+            return ["unknown"] * len(lookup(results, self.fallback) or [])
+        return [str(item.get(self.field)).lower() for item in items or [] if isinstance(item, dict)]
+
+    def extract(self, results):
+        if self.op == "weighted":
+            return float(sum(self.item_weights.get(label, self.default_weight) for label in self._labels(results)))
+        value = lookup(results, self.path)
+        if self.op == "flag":
+            return 1.0 if value else 0.0
+        if self.op == "value":
+            try:
+                return float(value or 0)
+            except (TypeError, ValueError):
+                return 0.0
+        if not value:
+            return 0.0
+        if self.op == "match":
+            return float(len(self.values.intersection(value)))
+        return float(len(value))
+
+    def describe(self, results, value):
+        if not self.detail:
+            return None
+        matches = ""
+        if self.op == "match":
+            matches = ", ".join(self.values.intersection(lookup(results, self.path) or []))
+        elif self.op == "weighted":
+            labels = self._labels(results)
+            matches = ", ".join(
+                f"{labels.count(label)} {label}"
+                for label in dict.fromkeys(labels) if self.item_weights.get(label, self.default_weight)
+            )
+        value = int(value) if float(value).is_integer() else round(value, 1)
+        return self.detail.format(value=value, matches=matches)
+
+
+class ScoringModel:
+    def __init__(self, config):
+        self.config = config
+        self.rules = [Rule(spec) for spec in config["rules"]]
+        self.max_score = float(config.get("max_score", 100))
+        levels = sorted(config["levels"], key=lambda item: item["min"], reverse=True)
+        self.level_names = [item["level"] for item in levels]
+        self.level_thresholds = np.array([item["min"] for item in levels], dtype=np.float64)
+        self.weights = np.array([rule.weight for rule in self.rules], dtype=np.float64)
+        self.caps = np.array([rule.cap for rule in self.rules], dtype=np.float64)
+
+    @classmethod
+    def load(cls, path=None):
+        with open(path or model_location, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def features(self, results_list):
+        """Build the (n_results, n_rules) feature matrix one column at a time."""
+        matrix = np.zeros((len(results_list), len(self.rules)), dtype=np.float64)
+        for column, rule in enumerate(self.rules):
+            matrix[:, column] = np.fromiter(
+                (rule.extract(results) for results in results_list), dtype=np.float64, count=len(results_list)
+            )
+        return matrix
+
+    def score_features(self, matrix):
+        contributions = np.minimum(matrix * self.weights, self.caps)
+        scores = np.clip(contributions.sum(axis=1), 0, self.max_score)
+        scores = np.rint(scores).astype(np.int64)
+        # Levels are sorted by descending threshold, so the first one a
+        # score reaches is its level.
+        reached = scores[:, None] >= self.level_thresholds[None, :]
+        level_index = np.where(reached.any(axis=1), reached.argmax(axis=1), len(self.level_names) - 1)
+        return scores, level_index
+
+    def assess_many(self, results_list):
+        """
+        Full risk objects (score, level, details) for a batch of results.
+
+        Returns:
+            list: One dict per result, as score() returns.
+        """
+        if not results_list:
+            return []
+        matrix = self.features(results_list)
+        scores, level_index = self.score_features(matrix)
+        return [
+            {"score": int(score), "level": self.level_names[level], "details": self._details(results, row)}
+            for results, row, score, level in zip(results_list, matrix, scores, level_index)
+        ]
+
+    def _details(self, results, row):
+        details = []
+        for rule, value in zip(self.rules, row):
+            if value and rule.weight:
+                detail = rule.describe(results, value)
+                if detail:
+                    details.append(detail)
+        return details
+
+    def score(self, results):
+        return self.assess_many([results])[0]
+
+
+_model = None
+
+
+def get_model():
+    global _model
+    if _model is None:
+        _model = ScoringModel.load()
+    return _model
+
+
+def reload_model(path=None):
+    global _model
+    _model = ScoringModel.load(path)
+    return _model
+
+
+def calculate_risk_score(results):
+    with telemetry.span("risk"):
+        return get_model().score(results)
+
+
+def main():
+    parser = ArgumentParser(description="Re-score stored scan history with the current risk model")
+    parser.add_argument("--model", help="path to a scoring model JSON file")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    from store.history import history
+
+    model = reload_model(args.model) if args.model else get_model()
+    print(history.rescore(model, batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+/scan orchestration shared by the Flask (main.py) and ASGI (asgi.py) apps.
+
+IPs are enriched by every registered "ip" provider. Domains are resolved
+to all of their A/AAAA addresses, each address is enriched in parallel,
+and the per-address results are merged into the top-level provider keys
+(with the unmerged view kept under "addresses").
+"""
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from attack.resolver import addresses, resolver, ResolutionError
+from providers import registry
+
+MAX_ADDRESSES = int(os.getenv("DNS_MAX_ADDRESSES", "8"))
+
+
+def _unique(items):
+    seen = []
+    for item in items:
+        if item not in seen:
+            seen.append(item)
+    return seen
+
+
+def merge_addresses(per_address: dict) -> dict:
+    """Merge per-address provider results into one /scan-shaped result."""
+    merged = {}
+    results_list = list(per_address.values())
+
+    def collect(name):
+        return [results[name] for results in results_list if isinstance(results.get(name), dict)]
+
+    ipapi = collect("ipapi")
+    if ipapi:
+        merged["ipapi"] = {"ip_info": [entry for result in ipapi for entry in result.get("ip_info") or []]}
+
+    talos = collect("talos")
+    if talos:
+        merged["talos"] = {"blacklisted": any(result.get("blacklisted") for result in talos)}
+
+    tor = collect("tor")
+    if tor:
+        merged["tor"] = {"found": any(result.get("found") for result in tor)}
+
+    internetdb = collect("internetdb")
+    if internetdb:
+        merged["internetdb"] = {
+            key: _unique(item for result in internetdb for item in result.get(key) or [])
+            for key in ("hostnames", "ports", "tags", "cves", "cve_details")
+        }
+
+    # Providers without a merge rule keep the first address's answer
+    for results in results_list:
+        for name, value in results.items():
+            if name != "error":
+                merged.setdefault(name, value)
+
+    errors = [results["error"] for results in results_list if results.get("error")]
+    if errors:
+        merged["error"] = errors[0] if len(errors) == 1 else "; ".join(errors)
+    return merged
+
+
+def scan_ip(ip: str) -> dict:
+    results = {}
+    # Providers are called individually so one degraded API doesn't
+    # discard the others' results.
+    for provider in registry.providers_for('ip'):
+        try:
+            results[provider.name] = registry.call(provider.name, ip)
+        except Exception as e:
+            print(f"Error during IP scanning: {str(e)}")
+            results["error"] = f"Error during IP scanning: {str(e)}"
+    return results
+
+
+def _scan_domain_providers(domain: str, results: dict):
+    for provider in registry.providers_for('domain'):
+        try:
+            results[provider.name] = registry.call(provider.name, domain)
+        except Exception as e:
+            print(f"Error during URL scanning: {str(e)}")
+            results["error"] = f"Error during URL scanning: {str(e)}"
+
+
+def scan_domain(domain: str) -> dict:
+    """
+    Raises:
+        ResolutionError: when the domain has no resolvable address.
+    """
+    records = resolver.resolve_sync(domain)
+    targets = addresses(records, MAX_ADDRESSES)
+
+    with ThreadPoolExecutor(max_workers=len(targets) + 1) as pool:
+        domain_results = {}
+        # Each task runs in a copy of this context so its spans reach the request trace
+        domain_future = pool.submit(contextvars.copy_context().run, _scan_domain_providers, domain, domain_results)
+        address_futures = [pool.submit(contextvars.copy_context().run, scan_ip, ip) for ip in targets]
+        per_address = {ip: future.result() for ip, future in zip(targets, address_futures)}
+        domain_future.result()
+
+    results = merge_addresses(per_address)
+    if "error" in domain_results and "error" in results:
+        domain_results["error"] = f"{results['error']}; {domain_results['error']}"
+    results.update(domain_results)
+    results["resolved"] = records
+    results["addresses"] = per_address
+    return results
+
+
+async def scan_ip_async(ip: str, client) -> dict:
+    providers = registry.providers_for('ip')
+    outcomes = await asyncio.gather(
+        *(registry.acall(provider.name, ip, client) for provider in providers), return_exceptions=True
+    )
+    results = {}
+    for provider, outcome in zip(providers, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Error during IP scanning: {str(outcome)}")
+            results["error"] = f"Error during IP scanning: {str(outcome)}"
+        else:
+            results[provider.name] = outcome
+    return results
+
+
+async def _scan_domain_providers_async(domain: str, client) -> dict:
+    providers = registry.providers_for('domain')
+    outcomes = await asyncio.gather(
+        *(registry.acall(provider.name, domain, client) for provider in providers), return_exceptions=True
+    )
+    results = {}
+    for provider, outcome in zip(providers, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Error during URL scanning: {str(outcome)}")
+            results["error"] = f"Error during URL scanning: {str(outcome)}"
+        else:
+            results[provider.name] = outcome
+    return results
+
+
+async def scan_domain_async(domain: str, client) -> dict:
+    records = await resolver.resolve(domain)
+    targets = addresses(records, MAX_ADDRESSES)
+
+    domain_results, *address_results = await asyncio.gather(
+        _scan_domain_providers_async(domain, client),
+        *(scan_ip_async(ip, client) for ip in targets),
+    )
+    per_address = dict(zip(targets, address_results))
+
+    results = merge_addresses(per_address)
+    if "error" in domain_results and "error" in results:
+        domain_results["error"] = f"{results['error']}; {domain_results['error']}"
+    results.update(domain_results)
+    results["resolved"] = records
+    results["addresses"] = per_address
+    return results
+
@@ -0,0 +1,198 @@
+"""
+Local catalog of breach metadata, keyed by breach name.
+
+Breach details (domain, date, exposed data, record count, ...) are the
+same for every email found in a breach, so they are stored here once and
+lookups only carry breach names. The catalog fills from breach-analytics
+responses as they come in, and in bulk from XposedOrNot's breach listing:
+
+    python -m store.breaches sync
+    python -m store.breaches show Adobe LinkedIn
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+database_location = os.getenv("BREACH_DB_PATH", "media/breaches.db")
+
+# How long a bulk sync is trusted before unknown breach names trigger another
+SYNC_TTL = int(os.getenv("BREACH_CATALOG_TTL", str(86400)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS breaches (
+    name TEXT PRIMARY KEY,
+    domain TEXT,
+    industry TEXT,
+    xposed_date TEXT,
+    xposed_records INTEGER,
+    details TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_breaches_domain ON breaches(domain);
+CREATE INDEX IF NOT EXISTS idx_breaches_industry ON breaches(industry);
+"""
+
+
+def connect(path=None):
+    path = path or database_location
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def from_listing(entry):
+    """Convert an entry of XposedOrNot's /breaches listing to the breach-analytics shape."""
+    exposed = entry.get("exposedData") or []
+    return {
+        "breach": entry.get("breachID"),
+        "details": entry.get("exposureDescription", ""),
+        "domain": entry.get("domain", ""),
+        "industry": entry.get("industry", ""),
+        "logo": entry.get("logo", ""),
+        "password_risk": entry.get("passwordRisk", ""),
+        "references": entry.get("referenceURL", ""),
+        "searchable": "Yes" if entry.get("searchable") else "No",
+        "verified": "Yes" if entry.get("verified") else "No",
+        "xposed_data": ";".join(exposed) if isinstance(exposed, list) else exposed,
+        "xposed_date": (entry.get("breachedDate") or "")[:4],
+        "xposed_records": entry.get("exposedRecords"),
+    }
+
+
+class BreachCatalog:
+    """
+    SQLite-backed catalog with an in-memory copy of every breach read so
+    far; there are a few thousand breaches at most, against millions of
+    emails referencing them.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or database_location
+        self.entries = {}
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+        return self._conn
+
+    def get_many(self, names):
+        """
+        Returns:
+            dict: Breach name -> details, for the names in the catalog.
+        """
+        found = {name: self.entries[name] for name in names if name in self.entries}
+        missing = [name for name in names if name not in found]
+        # Chunked to stay under SQLite's bound-parameter limit
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            with self._lock:
+                rows = self._db().execute(
+                    f"SELECT name, details FROM breaches WHERE name IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            for name, details in rows:
+                found[name] = self.entries[name] = json.loads(details)
+        return found
+
+    def upsert(self, breaches):
+        """Store breach details, skipping ones already known unchanged."""
+        changed = [
+            breach for breach in breaches
+            if breach.get("breach") and self.entries.get(breach["breach"]) != breach
+        ]
+        if not changed:
+            return 0
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO breaches (name, domain, industry, xposed_date, xposed_records, details, "
+                    "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (breach["breach"], breach.get("domain"), breach.get("industry"),
+                         str(breach.get("xposed_date", "")), breach.get("xposed_records"), json.dumps(breach), now)
+                        for breach in changed
+                    ],
+                )
+        for breach in changed:
+            self.entries[breach["breach"]] = breach
+        return len(changed)
+
+    def synced_at(self):
+        with self._lock:
+            row = self._db().execute("SELECT value FROM catalog_meta WHERE key = 'synced_at'").fetchone()
+        return float(row[0]) if row else 0.0
+
+    def needs_sync(self):
+        return time.time() - self.synced_at() > SYNC_TTL
+
+    def replace_listing(self, listing):
+        """Store a full /breaches listing and mark the catalog as synced."""
+        count = self.upsert([from_listing(entry) for entry in listing if entry.get("breachID")])
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('synced_at', ?)", (str(time.time()),)
+                )
+        return count
+
+    def search(self, domain=None, industry=None, limit=100):
+        clauses, params = [], []
+        if domain:
+            clauses.append("domain = ?")
+            params.append(domain)
+        if industry:
+            clauses.append("industry = ?")
+            params.append(industry)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT details FROM breaches {where} ORDER BY xposed_records DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+catalog = BreachCatalog()
+
+
+def main():
+    parser = ArgumentParser(description="Manage the local breach catalog")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("sync", help="download XposedOrNot's breach listing")
+    show = subparsers.add_parser("show", help="print catalog entries")
+    show.add_argument("names", nargs="*")
+    show.add_argument("--domain")
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        from osint.xposedornot import syncBreachCatalog
+
+        print(f"{syncBreachCatalog()} breaches updated", file=sys.stderr)
+    elif args.names:
+        print(json.dumps(catalog.get_many(args.names), indent=2))
+    else:
+        print(json.dumps(catalog.search(domain=args.domain), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+database_location = os.getenv("HISTORY_DB_PATH", "media/history.db")
+
+# Writer thread flushes whenever this many records are queued or the
+# interval elapses, whichever comes first.
+BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ioc TEXT NOT NULL,
+    ioc_type TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    asn TEXT,
+    country TEXT,
+    risk_score INTEGER,
+    risk_level TEXT,
+    result TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scan_cves (
+    scan_id INTEGER NOT NULL REFERENCES scans(id),
+    cve TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scans_ioc_time ON scans(ioc, created_at);
+CREATE INDEX IF NOT EXISTS idx_scans_time ON scans(created_at);
+CREATE INDEX IF NOT EXISTS idx_scans_asn ON scans(asn, created_at);
+CREATE INDEX IF NOT EXISTS idx_scans_country ON scans(country, created_at);
+CREATE INDEX IF NOT EXISTS idx_scans_risk ON scans(risk_level, created_at);
+CREATE INDEX IF NOT EXISTS idx_scan_cves_cve ON scan_cves(cve, scan_id);
+"""
+
+
+def connect(path=None):
+    path = path or database_location
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers (the query endpoint, other workers) run while the
+    # writer thread appends.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def normalize(ioc, ioc_type, kind, results):
+    """
+    Flatten a /scan or /footprint response into the indexed columns.
+
+    Returns:
+        tuple: (row dict, list of CVE IDs)
+    """
+    asn = None
+    country = None
+    ip_info = (results.get("ipapi") or {}).get("ip_info") or []
+    if ip_info and isinstance(ip_info, list):
+        info = ip_info[0] or {}
+        # ip-api reports "as" as "AS15169 Google LLC"
+        if info.get("as"):
+            asn = info["as"].split()[0].upper()
+        country = info.get("countryCode") or None
+
+    cves = []
+    for cve in (results.get("internetdb") or {}).get("cves") or []:
+        if isinstance(cve, dict):
+            cves.extend(cve.keys())
+        else:
+            cves.append(cve)
+
+    risk = results.get("risk") or {}
+    row = {
+        "ioc": ioc.lower(),
+        "ioc_type": ioc_type,
+        "kind": kind,
+        "created_at": time.time(),
+        "asn": asn,
+        "country": country,
+        "risk_score": risk.get("score"),
+        "risk_level": risk.get("level"),
+        "result": json.dumps(results, default=str),
+    }
+    return row, [c.upper() for c in cves]
+
+
+class ScanHistory:
+    """
+    Append-only store of scan results.
+
+    `record()` only enqueues; a daemon thread drains the queue and commits
+    in batches so the request path never waits on disk.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or database_location
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_writer(self):
+        if self._writer and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._writer.start()
+
+    def record(self, ioc, ioc_type, kind, results):
+        try:
+            self._queue.put_nowait(normalize(ioc, ioc_type, kind, results))
+        except Exception as e:
+            print(f"Error queueing scan history: {str(e)}")
+            return
+        self._ensure_writer()
+
+    def _run(self):
+        conn = connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(conn, batch)
+            except Exception as e:
+                print(f"Error writing scan history: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, conn, batch):
+        with conn:
+            for row, cves in batch:
+                cursor = conn.execute(
+                    "INSERT INTO scans (ioc, ioc_type, kind, created_at, asn, country, risk_score, risk_level, result) "
+                    "VALUES (:ioc, :ioc_type, :kind, :created_at, :asn, :country, :risk_score, :risk_level, :result)",
+                    row,
+                )
+                if cves:
+                    conn.executemany(
+                        "INSERT INTO scan_cves (scan_id, cve) VALUES (?, ?)",
+                        [(cursor.lastrowid, cve) for cve in cves],
+                    )
+
+    def flush(self):
+        """Block until every queued record has been committed."""
+        if self._writer and self._writer.is_alive():
+            self._queue.join()
+
+    def query(self, ioc=None, since=None, until=None, asn=None, country=None,
+              cve=None, risk_level=None, kind=None, limit=100, include_result=True):
+        clauses = []
+        params = []
+        if ioc:
+            clauses.append("s.ioc = ?")
+            params.append(ioc.lower())
+        if since is not None:
+            clauses.append("s.created_at >= ?")
+            params.append(float(since))
+        if until is not None:
+            clauses.append("s.created_at <= ?")
+            params.append(float(until))
+        if asn:
+            asn = asn.upper()
+            clauses.append("s.asn = ?")
+            params.append(asn if asn.startswith("AS") else f"AS{asn}")
+        if country:
+            clauses.append("s.country = ?")
+            params.append(country.upper())
+        if risk_level:
+            clauses.append("s.risk_level = ?")
+            params.append(risk_level.capitalize())
+        if kind:
+            clauses.append("s.kind = ?")
+            params.append(kind)
+        if cve:
+            clauses.append("s.id IN (SELECT scan_id FROM scan_cves WHERE cve = ?)")
+            params.append(cve.upper())
+
+        columns = "s.id, s.ioc, s.ioc_type, s.kind, s.created_at, s.asn, s.country, s.risk_score, s.risk_level"
+        if include_result:
+            columns += ", s.result"
+        sql = f"SELECT {columns} FROM scans s"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY s.created_at DESC LIMIT ?"
+        params.append(int(limit))
+
+        rows = []
+        for row in self._reader().execute(sql, params):
+            item = dict(row)
+            if include_result:
+                item["result"] = json.loads(item["result"])
+            rows.append(item)
+        return rows
+
+    def rescore(self, model, batch_size=5000):
+        """
+        Recompute risk for every stored /scan result with `model`, in the
+        risk columns and in the stored result body alike.
+
+        Rows are read and updated in id order, one batch per transaction,
+        so the whole table is never held in memory.
+        """
+        self.flush()
+        conn = connect(self.path)
+        last_id = 0
+        total = 0
+        started = time.monotonic()
+        try:
+            while True:
+                rows = conn.execute(
+                    "SELECT id, result FROM scans WHERE kind = 'scan' AND id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                results_list = [json.loads(row["result"]) for row in rows]
+                for results in results_list:
+                    # The old risk is not an input to the new one
+                    results.pop("risk", None)
+                risks = model.assess_many(results_list)
+                with conn:
+                    conn.executemany(
+                        "UPDATE scans SET risk_score = ?, risk_level = ?, result = ? WHERE id = ?",
+                        [
+                            (risk["score"], risk["level"], json.dumps({**results, "risk": risk}), row["id"])
+                            for risk, results, row in zip(risks, results_list, rows)
+                        ],
+                    )
+                last_id = rows[-1]["id"]
+                total += len(rows)
+        finally:
+            conn.close()
+        return {"rescored": total, "seconds": round(time.monotonic() - started, 3)}
+
+    def diff(self, ioc, limit=2):
+        """
+        Compare the newest scan of `ioc` against the previous ones.
+
+        Returns:
+            dict: Per-provider keys that were added, removed or changed.
+        """
+        rows = self.query(ioc=ioc, limit=max(limit, 2))
+        if len(rows) < 2:
+            return {"ioc": ioc, "scans": len(rows), "changes": {}}
+
+        newer, older = rows[0]["result"], rows[1]["result"]
+        changes = {}
+        for key in sorted(set(newer) | set(older)):
+            before, after = older.get(key), newer.get(key)
+            if before != after:
+                changes[key] = {"before": before, "after": after}
+
+        return {
+            "ioc": ioc,
+            "scans": len(rows),
+            "from": rows[1]["created_at"],
+            "to": rows[0]["created_at"],
+            "changes": changes,
+        }
+
+
+history = ScanHistory()
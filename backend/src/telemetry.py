@@ -0,0 +1,210 @@
+"""
+Request tracing and Prometheus metrics.
+
+`span(stage, **labels)` times a block of work. Every span feeds a latency
+histogram and, on exceptions, an error counter labelled "timeout" or
+"error"; both are rendered in Prometheus text format by `/metrics`. When a
+request runs inside `trace()`, its spans are also collected (through a
+context variable, so they follow asyncio tasks and `asyncio.to_thread`)
+and can be returned as a timing breakdown.
+
+Metrics are kept per process: with several gunicorn workers each one
+reports its own series, which Prometheus aggregates per instance.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+PREFIX = "recongraph"
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGES = {
+    "request": "HTTP request latency by endpoint.",
+    "dns": "DNS resolution latency.",
+    "provider": "Provider call latency, cache hits excluded.",
+    "risk": "Risk scoring latency.",
+    "pe": "PE file parsing latency.",
+    "site": "Username probe latency per site.",
+    "ingest_batch": "Log ingestion enrichment batch latency.",
+}
+
+COUNTERS = {
+    "requests_total": "HTTP requests by endpoint and status.",
+    "provider_cache_hits_total": "Provider results served from the registry cache.",
+    "provider_stale_total": "Stale provider results served while the provider was unavailable.",
+}
+
+_current = contextvars.ContextVar("recongraph_trace", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, labels, seconds):
+        key = (stage, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.counts[bisect_left(BUCKETS, seconds)] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self):
+        """Render every series in the Prometheus text exposition format."""
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = []
+        described = set()
+        for (stage, labels), histogram in histograms:
+            name = f"{PREFIX}_{stage}_seconds"
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {STAGES.get(stage, stage)}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+        for (counter, labels), value in counters:
+            name = f"{PREFIX}_{counter}"
+            if name not in described:
+                described.add(name)
+                help_text = COUNTERS.get(counter)
+                if help_text is None and counter.endswith("_errors_total"):
+                    help_text = f"Failures by kind ({counter[:-len('_errors_total')]} stage)."
+                lines.append(f"# HELP {name} {help_text or counter}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
+
+
+def _error_kind(exc):
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)) or "Timeout" in type(exc).__name__ \
+            or "timed out" in str(exc):
+        return "timeout"
+    return "error"
+
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def summary(self):
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 2), "spans": self.spans}
+
+
+def start_request():
+    """Start tracing the current request (called from before_request)."""
+    current = Trace()
+    _current.set(current)
+    return current
+
+
+def finish_request(endpoint, status, current):
+    """Record request latency and status (called from after_request)."""
+    labels = (("endpoint", endpoint or "unknown"),)
+    if current is not None:
+        metrics.observe("request", labels, time.perf_counter() - current.started)
+    metrics.inc("requests_total", labels + (("status", str(status)),))
+    _current.set(None)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@contextmanager
+def trace():
+    """Collect the spans of the enclosed work into a Trace."""
+    current = Trace()
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(stage, traced=True, **labels):
+    """
+    Time the enclosed block as `stage`.
+
+    Args:
+        stage (str): Histogram name, one of STAGES.
+        traced (bool): Whether to add the span to the current trace; off
+            for high-fan-out stages such as per-site probes.
+        **labels: Prometheus labels, e.g. provider="ipapi".
+    """
+    label_items = tuple(sorted(labels.items()))
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = _error_kind(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe(stage, label_items, elapsed)
+        if error:
+            metrics.inc(f"{stage}_errors_total", label_items + (("kind", error),))
+        current = _current.get()
+        if traced and current is not None:
+            entry = {"stage": stage, **labels,
+                     "start_ms": round((started - current.started) * 1000, 2),
+                     "ms": round(elapsed * 1000, 2)}
+            if error:
+                entry["error"] = error
+            current.spans.append(entry)
+
+
+def inc(name, **labels):
+    metrics.inc(name, tuple(sorted(labels.items())))
+
+
+def wants_timings(args, body=None):
+    """Whether a request asked for a timing breakdown (?timings=true or "timings": true)."""
+    if args.get("timings", "false").lower() in ("1", "true"):
+        return True
+    return bool(isinstance(body, dict) and body.get("timings"))
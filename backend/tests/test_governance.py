@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import pytest
+
+from providers import governance
+from providers.governance import Governor, Policy, ProviderUnavailable, TokenBucket
+
+
+@pytest.fixture
+def governor(tmp_path, monkeypatch):
+    monkeypatch.setitem(governance.POLICIES, "test", Policy(rate=10, burst=1, max_concurrency=1, cooldown=0.2))
+    return Governor(TokenBucket(str(tmp_path / "ratelimits.db")))
+
+
+def test_call_waits_for_a_token(governor):
+    assert governor.call("test", "a", lambda: {"n": 1}) == {"n": 1}
+    started = time.monotonic()
+    # The bucket is empty; the next token is due in 0.1s
+    assert governor.call("test", "b", lambda: {"n": 2}) == {"n": 2}
+    assert time.monotonic() - started >= 0.05
+
+
+def test_acall_waits_for_a_token_and_a_slot(governor):
+    async def slow():
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    async def run():
+        return await asyncio.gather(*(governor.acall("test", str(i), slow) for i in range(3)))
+
+    assert asyncio.run(run()) == [{"ok": True}] * 3
+
+
+def test_rate_limited_once_past_max_wait(governor, monkeypatch):
+    monkeypatch.setattr(governance, "MAX_WAIT", 0.0)
+    governor.call("test", "a", lambda: {})
+    with pytest.raises(ProviderUnavailable, match="rate limited"):
+        governor.call("test", "b", lambda: {})
+
+
+def test_half_open_trial_is_released_on_fallback(governor, monkeypatch):
+    _, breaker, _ = governor._state("test")
+    breaker.state, breaker.opened_at = breaker.OPEN, time.monotonic() - 1
+    monkeypatch.setattr(governance, "MAX_WAIT", 0.0)
+    governor.call("test", "a", lambda: {})
+    # Half-open again, with an empty bucket: the trial gives up and is handed back
+    breaker.state = breaker.HALF_OPEN
+    with pytest.raises(ProviderUnavailable, match="rate limited"):
+        governor.call("test", "b", lambda: {})
+    assert breaker.trial_started is None
+    assert breaker.allow()